@@ -1,5 +1,5 @@
-
-import os
+import os, sys, mmap, struct
+from collections import OrderedDict
 from PIL import Image
 
 class AssetManager ():
@@ -7,24 +7,116 @@ class AssetManager ():
     AssetManager manages a table of images for the sprites. They are
     generated on demand by the first call to the 'get' method. They can be
     files on disk or a 'generate' procedure that creates the Image.
+
+    A PNG that has been preprocessed with 'build' is loaded from its raw
+    .sprite file instead, without decoding.  The file is memory-mapped:
+    the mask is used in place, and the colors are copied out of the map,
+    since PIL keeps RGB images at four bytes a pixel.
+
+    Variants are requested by appending options to the name, separated by
+    '|': "Fish1-left.png|mirror" is flipped left to right, and
+    "Fish1-left.png|dim=0.5" has its colors scaled by 0.5.  They are
+    generated on demand from the base image.
+
+    The table holds at most max_bytes of image data, and drops the least
+    recently used entries beyond that.
     """
     root = None
-    assets = {}
+    assets = OrderedDict()
+    max_bytes = 4 * 1024 * 1024
+    nbytes = 0
+
+    raw_suffix = ".sprite"
+    raw_magic = b"WSPR"
+    raw_header = struct.Struct("<4sHH")
+
+    @staticmethod
+    def path (name):
+        if AssetManager.root:
+            return os.path.join(AssetManager.root, name)
+        return name
 
     @staticmethod
     def get (name, generate=None):
-        if not name in AssetManager.assets:
-            if generate:
-                img = generate()
-            else:
-                if AssetManager.root:
-                    path = os.path.join(AssetManager.root, name)
+        assets = AssetManager.assets
+        if name in assets:
+            assets.move_to_end(name)
+            return assets[name]
+        base, *options = name.split("|")
+        if options:
+            _, sprite, mask, width, height = AssetManager.get(base)
+            for option in options:
+                if option == "mirror":
+                    sprite = sprite.transpose(Image.FLIP_LEFT_RIGHT)
+                    mask = mask.transpose(Image.FLIP_LEFT_RIGHT)
+                elif option.startswith("dim="):
+                    factor = float(option[4:])
+                    sprite = sprite.point(lambda v: int(v * factor))
                 else:
-                    path = name
-                img = Image.open(path)
-            r, g, b, a = img.split()
-            sprite = Image.merge("RGB", (r, g, b))
-            mask = Image.merge("L", (a,))
-            width, height = img.width, img.height
-            AssetManager.assets[name] = (name, sprite, mask, width, height)
-        return AssetManager.assets[name]
+                    raise ValueError("unknown asset option: " + option)
+        elif generate:
+            sprite, mask = AssetManager.split(generate())
+        else:
+            sprite, mask = AssetManager.load(AssetManager.path(name))
+        width, height = sprite.width, sprite.height
+        assets[name] = (name, sprite, mask, width, height)
+        AssetManager.nbytes += width * height * 4
+        while AssetManager.nbytes > AssetManager.max_bytes and len(assets) > 1:
+            _, (_, _, _, w, h) = assets.popitem(last=False)
+            AssetManager.nbytes -= w * h * 4
+        return assets[name]
+
+    @staticmethod
+    def split (img):
+        """an RGBA image as an RGB sprite and an L mask"""
+        r, g, b, a = img.convert("RGBA").split()
+        return (Image.merge("RGB", (r, g, b)), Image.merge("L", (a,)))
+
+    @staticmethod
+    def load (path):
+        rawpath = path + AssetManager.raw_suffix
+        if os.path.exists(rawpath) and \
+           (not os.path.exists(path) or os.path.getmtime(rawpath) >= os.path.getmtime(path)):
+            return AssetManager.load_raw(rawpath)
+        return AssetManager.split(Image.open(path))
+
+    @staticmethod
+    def load_raw (rawpath):
+        with open(rawpath, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = AssetManager.raw_header
+        magic, width, height = header.unpack_from(data)
+        if magic != AssetManager.raw_magic:
+            raise ValueError("not a sprite file: " + rawpath)
+        view = memoryview(data)
+        rgbstart = header.size
+        maskstart = rgbstart + width * height * 3
+        ## frombuffer copies the RGB plane; the L mask shares the map
+        sprite = Image.frombuffer("RGB", (width, height),
+                                  view[rgbstart:maskstart], "raw", "RGB", 0, 1)
+        mask = Image.frombuffer("L", (width, height),
+                                view[maskstart:maskstart + width * height], "raw", "L", 0, 1)
+        return (sprite, mask)
+
+    @staticmethod
+    def build (path):
+        """preprocess a PNG into a raw .sprite file next to it"""
+        sprite, mask = AssetManager.split(Image.open(path))
+        ## write and rename, so a running pond that has the old file
+        ## mapped keeps its pages
+        rawpath = path + AssetManager.raw_suffix
+        tmp = rawpath + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(AssetManager.raw_header.pack(AssetManager.raw_magic,
+                                                 sprite.width, sprite.height))
+            f.write(sprite.tobytes())
+            f.write(mask.tobytes())
+        os.replace(tmp, rawpath)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "build":
+        print("Usage: AssetManager.py build <png>...")
+        sys.exit(1)
+    for path in sys.argv[2:]:
+        AssetManager.build(path)
@@ -1,40 +1,83 @@
 
-from random import *
-from AssetManager import AssetManager
+import numpy as np
 from mobs import Mob
+from utils import rng
 
 class Bubbles (Mob):
+    """
+    All the bubbles of a pond, as one mob.  Each bubble is a particle in
+    parallel arrays of x, starting y, speed and spawn time, so a frame
+    moves, culls and draws every bubble in one vectorized step.  The mob
+    is spawned with the first bubble and despawns when the last one pops,
+    and it keeps the mob counter's count of bubbles up to date.
+    """
     name = "bubbles"
-    start_position = (0, 0)
-    speed = (0, 0)
+    capacity = 64
     last_spawn_time = 0
     last_x = None
 
+    ## internal
+    count = 0
+    xs = None
+    y0s = None
+    speeds = None
+    t0s = None
+
     def __init__ (self, pond, t):
         super(Bubbles, self).__init__(pond, t)
-        if t - Bubbles.last_spawn_time < 1:
-            x = Bubbles.last_x + randint(-1,1)
+        self.xs = np.zeros(self.capacity)
+        self.y0s = np.zeros(self.capacity)
+        self.speeds = np.zeros(self.capacity)
+        self.t0s = np.zeros(self.capacity)
+
+    def spawn (self, pond, t):
+        """add a bubble at the bottom, near the last one if it was recent"""
+        if Bubbles.last_x is not None and t - Bubbles.last_spawn_time < 1:
+            x = Bubbles.last_x + rng.randint(-1,1)
         else:
-            x = random() * (pond.width - 2) + 1
+            x = rng.random() * (pond.width - 2) + 1
         Bubbles.last_x = x
         Bubbles.last_spawn_time = t
-        self.start_position = (x, pond.height - 1)
-        self.speed = (0, -5)
+        if self.count == len(self.xs):
+            for name in ("xs", "y0s", "speeds", "t0s"):
+                old = getattr(self, name)
+                new = np.zeros(len(old) * 2)
+                new[:len(old)] = old
+                setattr(self, name, new)
+        i = self.count
+        self.xs[i] = x
+        self.y0s[i] = pond.height - 1
+        self.speeds[i] = -5
+        self.t0s[i] = t
+        self.count += 1
+        pond.mobcounter.set(self.name, self.count)
 
 
     ## Public Interface
     ##
     def update (self, pond, t):
-        (x, y) = self.update_position(t)
-        (sx, sy) = self.speed
-        if y <= pond.level_px:
-            pond.mobcounter.remove(self)
-            return False
+        n = self.count
+        ys = (self.y0s[:n] + self.speeds[:n] * (t - self.t0s[:n])).astype(np.intp)
+        alive = ys > pond.level_px
+        if not alive.all():
+            n = self.count = int(np.count_nonzero(alive))
+            for a in (self.xs, self.y0s, self.speeds, self.t0s):
+                a[:n] = a[:len(alive)][alive]
+            ys = ys[alive]
+            pond.mobcounter.set(self.name, n)
+            if n == 0:
+                return False
         c = tuple([min(255, x + 30) for x in pond.watercolor])
-        pond.canvas.putpixel((x, y), c)
+        pond.compositor.pixels(self.xs[:n].astype(np.intp), ys, c)
         return True
 
     @staticmethod
     def maybe_spawn (pond, t):
-        if random() * pond.health**0.125 < 0.005 and pond.health > 0.3:
-            return Bubbles(pond, t)
+        if rng.random() * pond.health**0.125 < 0.005 and pond.health > 0.3:
+            bubbles = pond.mobs.first(Bubbles)
+            if bubbles:
+                bubbles.spawn(pond, t)
+            else:
+                bubbles = Bubbles(pond, t)
+                bubbles.spawn(pond, t)
+                return bubbles
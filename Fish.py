@@ -1,7 +1,7 @@
 
-from random import random, randint, getrandbits
-from AssetManager import AssetManager
+from SpriteAtlas import SpriteAtlas
 from mobs import Mob
+from utils import rng
 
 class Fish (Mob):
     name = "fish"
@@ -13,17 +13,17 @@ class Fish (Mob):
 
     def __init__ (self, pond, t, y, spriteleft, spriteright):
         super(Fish, self).__init__(pond, t)
-        direction = bool(getrandbits(1))
+        direction = bool(rng.getrandbits(1))
         if direction:
-            _, self.sprite, self.mask, self.width, self.height = \
-                AssetManager.get(spriteright)
+            self.sprite = spriteright
+            self.width, self.height = SpriteAtlas.size(self.sprite)
             start_x = -self.width
-            self.speed = (random() * 6 + 2, 0)
+            self.speed = (rng.random() * 6 + 2, 0)
         else:
-            _, self.sprite, self.mask, self.width, self.height = \
-                AssetManager.get(spriteleft)
+            self.sprite = spriteleft
+            self.width, self.height = SpriteAtlas.size(self.sprite)
             start_x = pond.width
-            self.speed = (-(random() * 6 + 2), 0)
+            self.speed = (-(rng.random() * 6 + 2), 0)
         self.start_position = (start_x, y)
 
 
@@ -38,7 +38,7 @@ class Fish (Mob):
         elif sx < 0 and x < -self.width:
             pond.mobcounter.remove(self)
             return False
-        pond.canvas.paste(self.sprite, self.position, self.mask)
+        pond.compositor.sprite(self.sprite, self.position)
         return True
 
     def scram (self, pond, t):
@@ -52,18 +52,21 @@ class Fish (Mob):
 
     @staticmethod
     def init_static ():
-        Fish.sprites = []
-        Fish.sprites.append(("fish1", AssetManager.get("assets/sprites/Fish1/Fish1-left.png"),
-                             AssetManager.get("assets/sprites/Fish1/Fish1-right.png")))
-        Fish.sprites.append(("fish2", AssetManager.get("assets/sprites/Fish2/Fish2-left.png"),
-                             AssetManager.get("assets/sprites/Fish2/Fish2-right.png")))
+        ## the right-facing sprites are mirrored from the left-facing ones.
+        ## they are packed into the atlas here, off the main loop at startup,
+        ## and drawn by their atlas index.
+        names = [("fish1", "assets/sprites/Fish1/Fish1-left.png",
+                  "assets/sprites/Fish1/Fish1-left.png|mirror"),
+                 ("fish2", "assets/sprites/Fish2/Fish2-left.png",
+                  "assets/sprites/Fish2/Fish2-left.png|mirror")]
+        Fish.sprites = [(shortname, SpriteAtlas.add(leftname), SpriteAtlas.add(rightname))
+                        for shortname, leftname, rightname in names]
 
     @staticmethod
     def maybe_spawn (pond, t):
-        shortname, left, right  = Fish.sprites[randint(0, len(Fish.sprites)-1)]
-        leftname,_,_,_,height = left
-        rightname,_,_,_,_ = right
+        shortname, left, right = Fish.sprites[rng.randint(0, len(Fish.sprites)-1)]
+        _, height = SpriteAtlas.size(left)
         ymin = pond.level_px + int(height * 0.5)
         ymax = pond.height - int(height * 1.5)
-        if random() * pond.health**0.125 < 0.0005 and pond.health > 0.3 and ymin < ymax:
-            return Fish(pond, t, randint(ymin, ymax), leftname, rightname)
+        if rng.random() * pond.health**0.125 < 0.0005 and pond.health > 0.3 and ymin < ymax:
+            return Fish(pond, t, rng.randint(ymin, ymax), left, right)
@@ -0,0 +1,190 @@
+import numpy as np
+from mobs import GoodDroplet, BadDroplet
+from utils import rng
+from sediment import SedimentCounter, EMPTY, GOOD, BAD
+
+class NumpyMud ():
+    """
+    An alternate Mud engine with the same interface as Mud.  The sediment
+    is kept in a uint8 material grid (EMPTY, GOOD, BAD) and the fall,
+    diagonal slide and decay passes of runphysics are array operations
+    over the bands of columns that changed.  The grid is rendered into the
+    pond's compositor through a palette lookup.  As in Mud, value is the
+    good minus the bad sediment.
+
+    Select it in the config with:
+
+        from NumpyMud import NumpyMud
+        Pond.mud_class = NumpyMud
+    """
+    ## config
+    update_rate = 0.75
+    decay = None
+    tile_width = 16
+
+    ## internal
+    width = 0
+    height = 0
+    sediment = None
+    levels = None
+    grid = None
+    dirty = None
+    palette = None
+    rng = None
+    rgb = None
+    alpha = None
+
+    def __init__ (self, width=64, height=32):
+        self.width = width
+        self.height = height
+        self.palette = np.array([(0, 0, 0), GoodDroplet.color, BadDroplet.color],
+                                dtype=np.uint8)
+        self.reset()
+
+    def reset (self):
+        """clear away all the sediment, for a new game"""
+        width, height = self.width, self.height
+        self.levels = [height] * width
+        self.grid = np.zeros((height, width), dtype=np.uint8)
+        self.dirty = np.zeros((width + self.tile_width - 1) // self.tile_width, dtype=bool)
+        self.rng = np.random.RandomState(rng.getrandbits(32))
+        self.sediment = SedimentCounter(width)
+        self.rgb = np.zeros((height, width, 3), dtype=np.uint8)
+        self.alpha = np.zeros((height, width), dtype=bool)
+
+    @property
+    def value (self):
+        return self.sediment.value
+
+    def add (self, droplet, offset=(0,0)):
+        ox, oy = offset
+        x, y = droplet.position
+        x += ox
+        y += oy
+        self.deposit(x, y, GOOD if isinstance(droplet, GoodDroplet) else BAD)
+
+    def deposit (self, x, y, material):
+        """put material at (x, y), or on the top of column x if that is higher"""
+        y = self.levels[x] = max(2, min(self.levels[x], y))
+        if y >= 0:
+            if self.grid[y, x] != EMPTY:
+                self.sediment.remove(x, self.grid[y, x])
+            self.sediment.add(x, material)
+            self.grid[y, x] = material
+            self.rgb[y, x] = self.palette[material]
+            self.alpha[y, x] = True
+            self.dirty[x // self.tile_width] = True
+
+    def runphysics (self, pond, t):
+        """
+        Settle the tiles of tile_width columns that changed since their
+        last pass, or that hold sediment which can decay.  Each run of
+        neighboring dirty tiles is settled as one band.
+        """
+        tw = self.tile_width
+        if self.decay:
+            hassediment = np.array(self.sediment.columns) > 0
+            self.dirty |= np.add.reduceat(hassediment, np.arange(0, self.width, tw)) > 0
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], self.dirty, [False]))))
+        self.dirty[:] = False
+        for first, last in zip(edges[0::2].tolist(), edges[1::2].tolist()):
+            self.settle_band(first * tw, min(last * tw, self.width))
+
+    def settle_band (self, x0, x1):
+        """
+        Run the fall, slide and decay passes on columns x0 to x1.  One
+        column on each side is included so that sediment can slide onto
+        it, but it does not move itself.
+        """
+        a = max(0, x0 - 1)
+        b = min(self.width, x1 + 1)
+        grid = self.grid[:, a:b]
+        height, width = grid.shape
+        cols = np.arange(width)
+        active = (cols >= x0 - a) & (cols < x1 - a)
+        solid = grid != EMPTY
+
+        ## random decay makes holes, but nothing falls into them this pass
+        if self.decay:
+            decayed = solid & active & (self.rng.random_sample(grid.shape) < self.decay)
+            ys, xs = np.nonzero(decayed)
+            for x, material in zip((xs + a).tolist(), grid[ys, xs].tolist()):
+                self.sediment.remove(x, material)
+        else:
+            decayed = np.zeros_like(solid)
+
+        ## fall: everything with a space anywhere beneath it drops one row
+        space = ~solid
+        spacebelow = np.zeros_like(solid)
+        spacebelow[:-1] = np.logical_or.accumulate(space[::-1], axis=0)[::-1][1:]
+        falling = solid & spacebelow & ~decayed & active
+
+        new = grid.copy()
+        new[decayed | falling] = EMPTY
+        new[1:][falling[:-1]] = grid[:-1][falling[:-1]]
+        moved = np.zeros_like(solid)
+        moved[1:] = falling[:-1]
+
+        ## fall diagonally: as in Mud, the lowest resting grain of a column
+        ## that is more than one row above a neighbor's top slides down
+        ## onto that neighbor, to the row just above its top.  That grain
+        ## is two rows above the neighbor's top; with both neighbors lower,
+        ## it goes to the lower one, or a random one if they are level.
+        newsolid = new != EMPTY
+        top = np.where(newsolid.any(axis=0), newsolid.argmax(axis=0), height)
+        newspacebelow = np.zeros_like(solid)
+        newspacebelow[:-1] = np.logical_or.accumulate(~newsolid[::-1], axis=0)[::-1][1:]
+        resting = newsolid & ~newspacebelow & ~moved
+        yleft = np.full(width, -1)
+        yright = np.full(width, -1)
+        yleft[1:] = np.minimum(top[:-1] - 2, height - 1)
+        yright[:-1] = np.minimum(top[1:] - 2, height - 1)
+        left = (yleft >= top) & resting[np.maximum(yleft, 0), cols] & active
+        right = (yright >= top) & resting[np.maximum(yright, 0), cols] & active
+        coin = self.rng.random_sample(width) < 0.5
+        left &= ~right | (yleft > yright) | ((yleft == yright) & coin)
+        right &= ~left
+
+        ## a column that is the target of both neighbors takes only one
+        fromright = np.zeros(width, dtype=bool)
+        fromleft = np.zeros(width, dtype=bool)
+        fromright[:-1] = left[1:]
+        fromleft[1:] = right[:-1]
+        clash = fromright & fromleft
+        coin = self.rng.random_sample(width) < 0.5
+        left[1:] &= ~(clash[:-1] & coin[:-1])
+        right[:-1] &= ~(clash[1:] & ~coin[1:])
+
+        srcx = np.concatenate((cols[left], cols[right]))
+        dstx = np.concatenate((cols[left] - 1, cols[right] + 1))
+        srcy = np.concatenate((yleft[left], yright[right]))
+        dsty = srcy + 1
+        c = new[srcy, srcx]
+        new[srcy, srcx] = EMPTY
+        new[dsty, dstx] = c
+        for x1, x2 in zip((srcx + a).tolist(), (dstx + a).tolist()):
+            self.sediment.move(x1, x2)
+
+        ## a changed column dirties its own tile and its neighbors' tiles
+        changed = np.flatnonzero((new != grid).any(axis=0)) + a
+        if len(changed):
+            tiles = np.concatenate((changed, np.maximum(changed - 1, 0),
+                                    np.minimum(changed + 1, self.width - 1))) // self.tile_width
+            self.dirty[tiles] = True
+        grid[:] = new
+        self.rgb[:, a:b] = self.palette[new]
+        self.alpha[:, a:b] = newsolid = new != EMPTY
+        self.levels[a:b] = np.where(newsolid.any(axis=0), newsolid.argmax(axis=0), height).tolist()
+
+    def draw (self, pond, t):
+        ## nothing is drawn above the tallest pile
+        top = max(0, min(self.levels))
+        if top < self.height:
+            pond.compositor.blit(self.rgb[top:], self.alpha[top:], (0, top))
+
+    def step (self, pond, t):
+        ## the dirty tiles settle at once in runphysics
+        pass
+
+    def close (self):
+        pass
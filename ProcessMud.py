@@ -0,0 +1,184 @@
+import ctypes, multiprocessing, signal
+import numpy as np
+from mobs import GoodDroplet, BadDroplet
+from sediment import GOOD, BAD
+from utils import GameError
+import utils
+
+## fields of the shared header
+GENERATION = 0
+FRONT = 1
+READING = 2
+NGOOD = 3
+NBAD = 4
+RESETS = 5
+
+## event that clears the worker's grid
+RESET = "reset"
+
+class ProcessMud ():
+    """
+    A Mud engine that runs NumpyMud physics in a worker process, with the
+    same interface as Mud.  The render loop only posts add events and
+    settle requests to the worker, and draws straight from the grid image
+    that the worker publishes in shared memory.  One worker serves the
+    pond for its whole life; a new game clears its grid with reset.
+
+    The worker renders into one of three shared buffers, then publishes it
+    by making it the front buffer and advancing the generation.  Each
+    frame, step takes the front buffer for reading, and the worker never
+    writes to the front buffer or the one being read, so a frame always
+    sees a whole generation.  Generations published before the last
+    reset was handled are not drawn.  If the worker dies, step raises a
+    GameError.  The worker's timing does not follow the virtual clock, so
+    simulations with it are not deterministic.
+
+    Select it in the config with:
+
+        from ProcessMud import ProcessMud
+        Pond.mud_class = ProcessMud
+    """
+    ## config
+    update_rate = 0.75
+    decay = None
+    tile_width = 16
+
+    ## internal
+    width = 0
+    height = 0
+    levels = None
+    header = None
+    lock = None
+    events = None
+    process = None
+    rgbs = None
+    alphas = None
+    generation = -1
+    front = 0
+    resets = 0
+    stale = False
+
+    def __init__ (self, width=64, height=32):
+        self.width = width
+        self.height = height
+        self.levels = [height] * width
+        ctx = multiprocessing.get_context("spawn")
+        self.header = ctx.RawArray(ctypes.c_int64, 6)
+        self.lock = ctx.Lock()
+        self.events = ctx.Queue()
+        rgbraw = ctx.RawArray(ctypes.c_uint8, 3 * height * width * 3)
+        alpharaw = ctx.RawArray(ctypes.c_uint8, 3 * height * width)
+        self.rgbs = np.frombuffer(rgbraw, dtype=np.uint8).reshape(3, height, width, 3)
+        self.alphas = np.frombuffer(alpharaw, dtype=np.bool_).reshape(3, height, width)
+        palette = [(0, 0, 0), GoodDroplet.color, BadDroplet.color]
+        config = (self.decay, self.tile_width, utils.rng.getrandbits(32))
+        self.process = ctx.Process(
+            target=worker, name="mud", daemon=True,
+            args=(width, height, palette, config, self.header, self.lock,
+                  self.events, rgbraw, alpharaw))
+        self.process.start()
+
+    @property
+    def value (self):
+        if self.stale:
+            return 0
+        return self.header[NGOOD] - self.header[NBAD]
+
+    def reset (self):
+        """clear away all the sediment, for a new game"""
+        self.resets += 1
+        self.stale = True
+        self.levels = [self.height] * self.width
+        self.events.put(RESET)
+
+    def add (self, droplet, offset=(0,0)):
+        ox, oy = offset
+        x, y = droplet.position
+        x += ox
+        y += oy
+        self.levels[x] = max(2, min(self.levels[x], y))
+        material = GOOD if isinstance(droplet, GoodDroplet) else BAD
+        self.events.put((x, y, material))
+
+    def runphysics (self, pond, t):
+        self.events.put(())
+
+    def step (self, pond, t):
+        """take the newest published generation for this frame"""
+        if not self.process.is_alive():
+            raise GameError("mud worker exited with {}".format(self.process.exitcode),
+                            (0x33, 0x11, 0))
+        header = self.header
+        with self.lock:
+            if header[RESETS] != self.resets:
+                return
+            self.front = header[READING] = header[FRONT]
+            generation = header[GENERATION]
+        self.stale = False
+        if generation != self.generation:
+            self.generation = generation
+            solid = self.alphas[self.front]
+            self.levels = np.where(solid.any(axis=0), solid.argmax(axis=0),
+                                   self.height).tolist()
+
+    def draw (self, pond, t):
+        if self.stale:
+            return
+        ## nothing is drawn above the tallest pile
+        top = max(0, min(self.levels))
+        if top < self.height:
+            pond.compositor.blit(self.rgbs[self.front, top:], self.alphas[self.front, top:],
+                                 (0, top))
+
+    def close (self):
+        if self.process:
+            if self.process.is_alive():
+                self.events.put(None)
+            self.process.join(2.0)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+
+
+def worker (width, height, palette, config, header, lock, events, rgbraw, alpharaw):
+    """
+    Body of the worker process.  Events are (x, y, material) adds, () to
+    run a settling pass, RESET to clear the grid, or None to exit.  The
+    grid image is published after each pass, and after each batch of adds.
+    """
+    from NumpyMud import NumpyMud
+    signal.signal(signal.SIGINT, signal.SIG_IGN) ## the parent shuts us down
+    decay, tile_width, seed = config
+    utils.rng.seed(seed)
+    NumpyMud.decay = decay
+    NumpyMud.tile_width = tile_width
+    mud = NumpyMud(width, height)
+    mud.palette = np.array(palette, dtype=np.uint8)
+    rgbs = np.frombuffer(rgbraw, dtype=np.uint8).reshape(3, height, width, 3)
+    alphas = np.frombuffer(alpharaw, dtype=np.bool_).reshape(3, height, width)
+    resets = 0
+    while True:
+        event = events.get()
+        while True:
+            if event is None:
+                return
+            if event == RESET:
+                mud.reset()
+                resets += 1
+            elif event:
+                mud.deposit(*event)
+            else:
+                mud.runphysics(None, None)
+            if events.empty():
+                break
+            event = events.get()
+        with lock:
+            back = ({0, 1, 2} - {header[FRONT], header[READING]}).pop()
+        rgbs[back] = mud.rgb
+        alphas[back] = mud.alpha
+        with lock:
+            header[FRONT] = back
+            header[GENERATION] += 1
+            header[NGOOD] = mud.sediment.good
+            header[NBAD] = mud.sediment.bad
+            header[RESETS] = resets
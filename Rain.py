@@ -1,11 +1,11 @@
 
-from time import time
+import numpy as np
 from mobs import LEDStripMob, Droplet
 from utils import *
 
 class Rain (LEDStripMob):
     name = "rain"
-    last_spawn = time()
+    last_spawn = None
     color = (0, 0, 0xff)
     start_x = 10
     airspeed = (1.5, 8)
@@ -15,23 +15,28 @@ class Rain (LEDStripMob):
     time_entered_water = None
 
     def draw_on_matrix (self, pond, t):
-        trail_length = len(self.matrix_trail)
-        for i,((tx,ty),tt) in enumerate(self.matrix_trail):
-            if ty < pond.level_px:
-                blue = int(i / trail_length * 200 - (t - tt) * 150)
-                if blue > 0:
-                    pond.canvas.putpixel((tx, ty), (0, 0, blue))
+        trail = self.matrix_trail
+        ## entries older than this have no blue left
+        trail.expire(t - 200 / 150)
+        if trail:
+            xs, ys, ts = trail.arrays()
+            i = np.arange(trail.total - len(trail), trail.total)
+            blue = (i / trail.total * 200 - (t - ts) * 150).astype(int)
+            keep = (ys < pond.level_px) & (blue > 0)
+            colors = np.zeros((len(trail), 3), dtype=np.uint8)
+            colors[:, 2] = np.minimum(blue, 255)
+            pond.compositor.pixels(xs[keep], ys[keep], colors[keep])
         if self.time_entered_water is None:
             color = self.color
         else:
             factor = (t - self.time_entered_water) / self.fadetime
-            color = color_blend(self.color, pond.watercolor, factor)
+            color = gradients.blend(self.color, pond.watercolor, factor)
             if factor >= 1.0:
                 return False
-        pond.canvas.putpixel(self.position, color)
+        pond.compositor.pixel(self.position, color)
         x, y = self.position
         if y < pond.level_px:
-            self.matrix_trail.append((self.position, t))
+            self.matrix_trail.append(self.position, t)
         return True
 
 
@@ -52,10 +57,13 @@ class Rain (LEDStripMob):
             return False
         return True
 
+    @staticmethod
+    def init_static ():
+        Rain.last_spawn = now()
+
     @staticmethod
     def maybe_spawn (pond, t):
         if t > Rain.last_spawn + 10:
             Rain.last_spawn = t
-            droplet = next((x for x in pond.mobs if isinstance(x, Droplet)), None)
-            if not droplet:
+            if not pond.mobs.count(Droplet):
                 return Rain(pond, t)
@@ -1,5 +1,4 @@
 
-from time import time
 from mobs import LEDStripMob
 from utils import *
 
@@ -8,7 +7,7 @@ class Rain2 (LEDStripMob):
     A version of Rain that the trail go all the way down into the water.
     """
     name = "rain"
-    last_spawn = time()
+    last_spawn = None
     color = (0, 0, 0xff)
     start_x = 10
     airspeed = (1.5, 8)
@@ -19,16 +18,19 @@ class Rain2 (LEDStripMob):
     time_entered_water = None
 
     def draw_on_matrix (self, pond, t):
-        trail_length = len(self.matrix_trail)
+        trail = self.matrix_trail
+        trail.expire(t - self.trailfadetime)
         stilldrawing = False
 
         ## trail
-        for i,((tx,ty),tt) in enumerate(self.matrix_trail):
-            factor = (t - tt) / self.trailfadetime
-            if factor < 1.0:
+        if trail:
+            xs, ys, ts = trail.arrays()
+            factors = (t - ts) / self.trailfadetime
+            keep = factors < 1.0
+            if keep.any():
                 stilldrawing = True
-                tcolor = color_blend(self.color, pond.watercolor, factor)
-                pond.canvas.putpixel((tx, ty), tcolor)
+                colors = gradients.blend_array(self.color, pond.watercolor, factors)
+                pond.compositor.pixels(xs[keep], ys[keep], colors[keep])
 
         ##XXX: we may still need to draw the trail, but do we need to draw
         ##     the lead pixel?
@@ -39,13 +41,13 @@ class Rain2 (LEDStripMob):
             factor = 0.0
         else:
             factor = (t - self.time_entered_water) / self.fadetime
-            color = color_blend(self.color, pond.watercolor, factor)
+            color = gradients.blend(self.color, pond.watercolor, factor)
         if factor < 1.0:
             stilldrawing = True
-            pond.canvas.putpixel(self.position, color)
+            pond.compositor.pixel(self.position, color)
             x, y = self.position
             #if y < pond.level_px:
-            self.matrix_trail.append((self.position, t))
+            self.matrix_trail.append(self.position, t)
         return stilldrawing
 
 
@@ -66,6 +68,10 @@ class Rain2 (LEDStripMob):
             return False
         return True
 
+    @staticmethod
+    def init_static ():
+        Rain2.last_spawn = now()
+
     @staticmethod
     def maybe_spawn (pond, t):
         if t > Rain2.last_spawn + 10:
@@ -0,0 +1,60 @@
+import threading
+import numpy as np
+from AssetManager import AssetManager
+
+class SpriteAtlas ():
+    """
+    SpriteAtlas packs sprites from AssetManager into one buffer for the
+    compositor's batched sprite pass.  Only the pixels of a sprite with
+    nonzero alpha are kept: their colors, alphas and offsets within the
+    sprite are appended to flat arrays shared by all sprites.  Each sprite
+    also gets the bounding box of those pixels, so that the compositor can
+    cull sprites outside the frame, and clip only those on its edges,
+    before touching any pixels.
+
+    Sprites are added by name with 'add', which returns the index to draw
+    them by.  The packed arrays are replaced as a whole on each add, so
+    sprites can be added from a background thread while frames are drawn.
+    """
+    names = {}
+    sizes = []
+    packed = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def add (name):
+        """pack the AssetManager sprite name, if it is not yet, and return its index"""
+        with SpriteAtlas.lock:
+            if name in SpriteAtlas.names:
+                return SpriteAtlas.names[name]
+            _, sprite, mask, width, height = AssetManager.get(name)
+            alpha = np.asarray(mask.convert("L"))
+            ys, xs = np.nonzero(alpha)
+            rgb = np.asarray(sprite)[ys, xs]
+            if len(xs):
+                box = (xs.min(), ys.min(), xs.max() + 1, ys.max() + 1)
+            else:
+                box = (0, 0, 0, 0)
+            if SpriteAtlas.packed:
+                prgb, palpha, pxs, pys, starts, counts, boxes = SpriteAtlas.packed
+            else:
+                prgb = np.zeros((0, 3), dtype=np.uint8)
+                palpha = np.zeros(0, dtype=np.uint8)
+                pxs = pys = starts = counts = np.zeros(0, dtype=np.intp)
+                boxes = np.zeros((0, 4), dtype=np.intp)
+            SpriteAtlas.packed = (np.concatenate((prgb, rgb)),
+                                  np.concatenate((palpha, alpha[ys, xs])),
+                                  np.concatenate((pxs, xs)),
+                                  np.concatenate((pys, ys)),
+                                  np.append(starts, len(pxs)),
+                                  np.append(counts, len(xs)),
+                                  np.concatenate((boxes, [box])))
+            index = len(SpriteAtlas.sizes)
+            SpriteAtlas.sizes.append((width, height))
+            SpriteAtlas.names[name] = index
+            return index
+
+    @staticmethod
+    def size (index):
+        """the (width, height) of a packed sprite"""
+        return SpriteAtlas.sizes[index]
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Runs the pond on an asyncio event loop, as an alternative to Pond.run.
+
+Frame rendering, switch sampling, LED strip refresh, the mud and wave
+ticks, metrics sampling and status reporting are separate tasks on one
+event loop.  The calls that block on hardware, the I2C reads, the matrix
+swap and the strip writes, and printing the status, run in a thread
+pool.  The game itself, the modes and mobs, runs only on the event loop,
+so mode transitions work as they do under Pond.run.  It takes the same
+config files as watershed.py; the threaded switch and strip settings
+are ignored, since those have their own tasks here.
+
+Usage: aiorun.py [--null] <config>
+"""
+
+import asyncio, os, signal, sys
+from concurrent.futures import ThreadPoolExecutor
+if "--null" in sys.argv:
+    import mocks
+    mocks.install_matrix() ## before watershed imports rgbmatrix
+import watershed
+from AssetManager import AssetManager
+from metrics import Metrics
+from utils import now
+
+
+class AsyncRuntime ():
+    ## internal
+    pond = None
+    loop = None
+    executor = None
+    main = None
+
+    def __init__ (self, pond, loop):
+        self.pond = pond
+        self.loop = loop
+        self.executor = ThreadPoolExecutor(max_workers=4)
+
+    def blocking (self, fn, *args):
+        """run a blocking call in the thread pool"""
+        return self.loop.run_in_executor(self.executor, fn, *args)
+
+    def tasks (self):
+        pond = self.pond
+        tasks = [self.render(),
+                self.sample_switches(),
+                self.refresh_strip(),
+                self.every(pond.mud_class.update_rate,
+                           lambda t: pond.mud.runphysics(pond, t)),
+                self.every(watershed.Switches.poll_interval,
+                           lambda t: pond.current_mode.poll_switches(t)),
+                self.every(watershed.Wave.interval, pond.wave.update)]
+        if Metrics.enabled:
+            tasks.append(self.every(Metrics.interval,
+                                    lambda t: pond.metrics.sample(pond, t)))
+        if pond.status_interval:
+            tasks.append(self.report_status())
+        return tasks
+
+    async def every (self, period, fn):
+        """call fn(t) every period seconds"""
+        while True:
+            fn(now())
+            await asyncio.sleep(period)
+
+    async def render (self):
+        pond = self.pond
+        prof = pond.profiler
+        metrics = pond.metrics
+        while True:
+            await asyncio.sleep(max(0, pond.scheduler.next_delay()))
+            t = now()
+            start = prof.clock()
+            mstart = metrics.clock()
+            pond.compose(t)
+            pond.flush(t)
+            await self.blocking(pond.present)
+            prof.record("frame", start)
+            metrics.record_frame(mstart)
+
+    async def sample_switches (self):
+        switches = self.pond.switches
+        switches.start_sampling()
+        while True:
+            delay = await self.blocking(switches.sample)
+            await asyncio.sleep(delay)
+
+    async def refresh_strip (self):
+        ledstrip = self.pond.ledstrip
+        period = 1.0 / ledstrip.refresh_rate
+        out = bytearray(ledstrip.buffer)
+        while True:
+            out[:] = ledstrip.buffer
+            await self.blocking(ledstrip.strip.show, out)
+            await asyncio.sleep(period)
+
+    async def report_status (self):
+        pond = self.pond
+        while True:
+            await asyncio.sleep(pond.status_interval)
+            line = pond.changed_status()
+            if line:
+                await self.blocking(print, line)
+
+    def run (self):
+        """run the tasks until SIGINT"""
+        self.pond.start()
+        self.main = asyncio.gather(*self.tasks())
+        self.loop.add_signal_handler(signal.SIGINT, self.main.cancel)
+        try:
+            self.loop.run_until_complete(self.main)
+        except asyncio.CancelledError:
+            pass
+
+    def shutdown (self):
+        self.executor.shutdown()
+        self.pond.shutdown()
+        self.loop.close()
+
+
+if __name__ == "__main__":
+    selfdir = os.path.dirname(os.path.abspath(__file__))
+    AssetManager.root = selfdir
+    flags = [a for a in sys.argv[1:] if a.startswith("--")]
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if len(args) != 1 or not set(flags) <= set(["--null"]):
+        print("Usage: aiorun.py [--null] <config>")
+        sys.exit(1)
+    if "--null" in flags:
+        import headless
+        headless.use_null_backends()
+    watershed.load_config(args[0])
+    watershed.Switches.threaded = False
+    watershed.LEDStrip.threaded = False
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    runtime = AsyncRuntime(watershed.Pond(), loop)
+    runtime.run()
+    print("Exiting\n")
+    runtime.shutdown()
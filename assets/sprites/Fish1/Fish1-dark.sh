@@ -16,5 +16,6 @@ convert `: use morphology to make black edge pixels`        \
                                                             \
          -trim +repage                                      \
                                                             \
-         `: save left-facing and right-facing versions`     \
-          -write Fish1-left.png -flop Fish1-right.png
+         `: save the left-facing version, AssetManager      \
+            mirrors it for the right-facing one`            \
+          Fish1-left.png
@@ -0,0 +1,173 @@
+import numpy as np
+from PIL import Image
+from SpriteAtlas import SpriteAtlas
+
+class Compositor ():
+    """
+    Builds each frame in an RGB array.  Drawing calls queue batches of
+    writes: a background fill, batches of (x, y, color) pixel writes,
+    alpha-masked blits and batches of SpriteAtlas sprites.  Consecutive
+    single-pixel writes are coalesced into one batch, and so are
+    consecutive sprites.  flush() applies the batches in submission
+    order, which is z order since mobs draw in z order, as vectorized
+    passes, and returns the frame as an Image in one conversion.  Writes
+    outside the frame are clipped.
+    """
+    width = 0
+    height = 0
+    frame = None
+    ops = None
+    pending = None
+    pending_sprites = None
+
+    def __init__ (self, width, height):
+        self.width = width
+        self.height = height
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+        self.ops = []
+        self.pending = ([], [], [])
+        self.pending_sprites = ([], [], [])
+
+    ## Drawing
+    ##
+    def fill (self, layer):
+        """replace the whole frame with layer, an array of the frame's shape"""
+        self.end_batch()
+        self.ops.append((self.apply_fill, (layer,)))
+
+    def pixel (self, position, color):
+        if self.pending_sprites[0]:
+            self.end_batch()
+        xs, ys, colors = self.pending
+        x, y = position
+        xs.append(x)
+        ys.append(y)
+        colors.append(color)
+
+    def pixels (self, xs, ys, colors):
+        """
+        Queue a batch of pixel writes.  xs and ys are integer arrays and
+        colors is either an (n, 3) array or a single color for all of them.
+        """
+        self.end_batch()
+        self.ops.append((self.apply_pixels, (xs, ys, colors)))
+
+    def blit (self, rgb, alpha, position):
+        """
+        Queue an (h, w, 3) rgb array blended through an (h, w) alpha array.
+        A bool alpha array is a plain cutout mask, which is cheaper.
+        """
+        self.end_batch()
+        self.ops.append((self.apply_blit, (rgb, alpha, position)))
+
+    def sprite (self, index, position):
+        """queue the SpriteAtlas sprite index with its top left corner at position"""
+        if self.pending[0]:
+            self.end_batch()
+        indices, xs, ys = self.pending_sprites
+        x, y = position
+        indices.append(index)
+        xs.append(x)
+        ys.append(y)
+
+    def end_batch (self):
+        xs, ys, colors = self.pending
+        if xs:
+            self.ops.append((self.apply_pixels,
+                             (np.array(xs), np.array(ys), np.array(colors, dtype=np.uint8))))
+            self.pending = ([], [], [])
+        indices, xs, ys = self.pending_sprites
+        if indices:
+            self.ops.append((self.apply_sprites,
+                             (SpriteAtlas.packed, np.array(indices, dtype=np.intp),
+                              np.array(xs, dtype=np.intp), np.array(ys, dtype=np.intp))))
+            self.pending_sprites = ([], [], [])
+
+    def flush (self):
+        self.end_batch()
+        for fn, args in self.ops:
+            fn(*args)
+        self.ops = []
+        return Image.fromarray(self.frame)
+
+    ## Passes
+    ##
+    def apply_fill (self, layer):
+        self.frame[:] = layer
+
+    def apply_pixels (self, xs, ys, colors):
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        if not inside.all():
+            xs = xs[inside]
+            ys = ys[inside]
+            if np.ndim(colors) == 2:
+                colors = colors[inside]
+        self.frame[ys, xs] = colors
+
+    def apply_blit (self, rgb, alpha, position):
+        x, y = position
+        h, w = alpha.shape
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + w, self.width)
+        y1 = min(y + h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        src = rgb[y0-y:y1-y, x0-x:x1-x]
+        a = alpha[y0-y:y1-y, x0-x:x1-x, np.newaxis]
+        dst = self.frame[y0:y1, x0:x1]
+        if a.dtype == np.bool_:
+            np.copyto(dst, src, where=a)
+        else:
+            a = a.astype(np.uint16)
+            dst[:] = (src * a + dst * (255 - a) + 127) // 255
+
+    def apply_sprites (self, packed, indices, xs, ys):
+        """
+        Draw a batch of atlas sprites in one gather, blend and scatter over
+        their pixels.  Where sprites overlap, a pixel written by several of
+        them is blended in layers, in the order of the sprites, so that
+        each blends over the ones before it.
+        """
+        rgb, alpha, pxs, pys, starts, counts, boxes = packed
+        box = boxes[indices]
+        x0 = xs + box[:, 0]
+        y0 = ys + box[:, 1]
+        x1 = xs + box[:, 2]
+        y1 = ys + box[:, 3]
+        visible = (x0 < self.width) & (x1 > 0) & (y0 < self.height) & (y1 > 0)
+        if not visible.all():
+            indices, xs, ys = indices[visible], xs[visible], ys[visible]
+            x0, y0, x1, y1 = x0[visible], y0[visible], x1[visible], y1[visible]
+            if len(indices) == 0:
+                return
+        counts = counts[indices]
+        ends = np.cumsum(counts)
+        src = np.arange(ends[-1]) + np.repeat(starts[indices] - ends + counts, counts)
+        dx = pxs[src] + np.repeat(xs, counts)
+        dy = pys[src] + np.repeat(ys, counts)
+        if ((x0 < 0) | (x1 > self.width) | (y0 < 0) | (y1 > self.height)).any():
+            inside = (dx >= 0) & (dx < self.width) & (dy >= 0) & (dy < self.height)
+            src, dx, dy = src[inside], dx[inside], dy[inside]
+        dst = dy * self.width + dx
+        frame = self.frame.reshape(-1, 3)
+
+        ## the layer of a pixel is the number of earlier writes to its dst
+        n = len(dst)
+        order = np.argsort(dst, kind="stable")
+        sdst = dst[order]
+        first = np.ones(n, dtype=np.bool_)
+        first[1:] = sdst[1:] != sdst[:-1]
+        if first.all():
+            self.blend_pixels(frame, dst, rgb[src], alpha[src])
+            return
+        positions = np.arange(n)
+        layer = np.empty(n, dtype=np.intp)
+        layer[order] = positions - np.maximum.accumulate(np.where(first, positions, 0))
+        for k in range(layer.max() + 1):
+            sel = src[layer == k]
+            self.blend_pixels(frame, dst[layer == k], rgb[sel], alpha[sel])
+
+    def blend_pixels (self, frame, dst, rgb, alpha):
+        a = alpha[:, np.newaxis].astype(np.uint16)
+        frame[dst] = (rgb * a + frame[dst] * (255 - a) + 127) // 255
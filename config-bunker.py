@@ -5,9 +5,19 @@ from Bubbles import Bubbles
 
 Switches.i2c_address = 0x20
 Switches.throttle = 0.5
+Switches.poll_interval = 0.02
+Switches.threaded = True
 
 LEDStrip.datapin = 24
 LEDStrip.clockpin = 25
+LEDStrip.threaded = True
+LEDStrip.refresh_rate = 60
+
+## wave profiles can be switched at runtime with pond.wave.set_profile(name)
+Wave.profiles = {
+    "default": WaveProfile(amplitude=1.0, exponent=2, speed=5.0),
+    "calm": WaveProfile(amplitude=0.6, exponent=3, speed=2.0) }
+Wave.profile = "default"
 
 LEDStrip.sections_spec = [
     { "name": "wave", "length": 80, "direction": -1 },
@@ -21,10 +31,47 @@ LEDStrip.sections_spec = [
 Pond.healthsteps = 120
 Pond.active_spawners = [Fish, Rain, Bubbles]
 Pond.initial_level = 0.7
+Pond.frame_rate = 100
+
+## matrix geometry: chain_length panels across, parallel chains down
+Pond.panel_rows = 32
+Pond.panel_cols = 64
+Pond.chain_length = 1
+Pond.parallel = 1
+
+## per-phase frame timing; dump a summary with `kill -USR1 <pid>`
+Profiler.enabled = False
+# Profiler.dump_path = "/tmp/watershed-profile.txt"
+
+## publish metrics in the Prometheus text format; /run/watershed is made
+## by the service's RuntimeDirectory.  point the node exporter's
+## --collector.textfile.directory at it, or read the socket with
+## `socat - UNIX-CONNECT:/run/watershed/metrics.sock`
+Metrics.enabled = True
+Metrics.interval = 5.0
+Metrics.textfile_path = "/run/watershed/watershed.prom"
+Metrics.socket_path = "/run/watershed/metrics.sock"
+
+## and a status line for the journal, at most once a minute
+Pond.status_interval = 60.0
+
+## record every frame for replay.py
+# Pond.record_path = "/tmp/watershed.rec"
 
 Mud.update_rate = 0.5
 # Mud.decay = 0.002
 
+## to compare against the numpy mud engine:
+# from NumpyMud import NumpyMud
+# Pond.mud_class = NumpyMud
+# NumpyMud.update_rate = 0.5
+# NumpyMud.decay = 0.002
+
+## or to run the numpy mud engine in its own process:
+# from ProcessMud import ProcessMud
+# Pond.mud_class = ProcessMud
+# ProcessMud.update_rate = 0.5
+
 Rain.length = 7
 Rain.color = (0, 0, 0xff)
 Rain.start_x = 0
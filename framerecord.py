@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Recording of the exact output of the pond, the matrix frame and the LED
+strip buffer, and reading it back.
+
+A recording starts with a header giving the matrix size and the number
+of strip pixels, followed by one record per frame.  Each record is the
+frame time and either a keyframe, with the whole matrix frame and strip
+buffer, or a delta with only the runs of pixels that changed since the
+previous frame.  A delta gives the start and length of each run, then
+the pixels of all the runs.  A recording that reaches
+FrameRecorder.max_bytes is rotated, and every file starts with its own
+header and a keyframe, so each one can be replayed on its own.
+
+Usage: framerecord.py compare <recording> <recording>
+"""
+
+import os, struct, sys, threading
+from collections import deque
+from itertools import zip_longest
+from time import sleep
+import numpy as np
+
+magic = b"WSR2"
+file_header = struct.Struct("<4sHHH")
+frame_header = struct.Struct("<dBII")
+
+KEYFRAME = 0
+DELTA = 1
+
+
+def encode_delta (current, previous):
+    """
+    The number of runs where current differs from previous, both
+    (npixels, depth) arrays, and the encoded runs: their start indices and
+    lengths as uint32 arrays, then the changed pixels.
+    """
+    ne = current != previous
+    changed = ne[:, 0]
+    for k in range(1, ne.shape[1]):
+        changed = changed | ne[:, k]
+    padded = np.zeros(len(changed) + 2, dtype=np.bool_)
+    padded[1:-1] = changed
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    starts = edges[0::2]
+    lengths = edges[1::2] - starts
+    return (len(starts), starts.astype(np.uint32).tobytes() +
+            lengths.astype(np.uint32).tobytes() + current[changed].tobytes())
+
+
+def decode_delta (data, i, nruns, pixels):
+    """apply nruns runs encoded at data[i:] to pixels and return the end index"""
+    if nruns == 0:
+        return i
+    starts = np.frombuffer(data, np.uint32, nruns, i).astype(np.intp)
+    lengths = np.frombuffer(data, np.uint32, nruns, i + nruns * 4).astype(np.intp)
+    i += nruns * 8
+    n = int(lengths.sum())
+    ends = np.cumsum(lengths)
+    index = np.arange(n) + np.repeat(starts - ends + lengths, lengths)
+    depth = pixels.shape[1]
+    pixels[index] = np.frombuffer(data, np.uint8, n * depth, i).reshape(-1, depth)
+    return i + n * depth
+
+
+class FrameRecorder ():
+    """
+    Appends frames to a recording.  record() finds the changed runs and
+    queues the encoded record for a writer thread, which writes out the
+    queue every write_interval seconds, so the frame loop never waits on
+    the disk.  A keyframe is written every keyframe_interval frames.
+
+    Once the file reaches max_bytes, it is renamed to path.1, older files
+    move up to path.keep_files, and a new file is started with a
+    keyframe.  While the writer is more than queue_limit records behind,
+    frames are dropped and counted in dropped, and the next frame
+    recorded is a keyframe.
+    """
+    ## config
+    keyframe_interval = 300
+    write_interval = 0.5
+    max_bytes = 64 * 1024 * 1024 ## None to never rotate
+    keep_files = 3
+    queue_limit = 600 ## None to never drop frames
+
+    ## internal
+    path = None
+    header = None
+    f = None
+    matrix = None
+    strip = None
+    since_keyframe = None
+    size = 0
+    dropped = 0
+    queue = None
+    thread = None
+    running = False
+
+    def __init__ (self, path, width, height, npixels):
+        self.path = path
+        self.header = file_header.pack(magic, width, height, npixels)
+        self.f = open(path, "wb")
+        self.f.write(self.header)
+        self.size = len(self.header)
+        self.matrix = np.zeros((height * width, 3), dtype=np.uint8)
+        self.strip = np.zeros((npixels, 4), dtype=np.uint8)
+        self.queue = deque()
+        self.running = True
+        self.thread = threading.Thread(target=self.write_loop,
+                                       name="framerecord", daemon=True)
+        self.thread.start()
+
+    def record (self, t, frame, strip):
+        """record an (h, w, 3) frame array and a strip bytearray"""
+        if self.queue_limit and len(self.queue) >= self.queue_limit:
+            self.dropped += 1
+            self.since_keyframe = None
+            return
+        if self.max_bytes and self.size >= self.max_bytes:
+            self.queue.append(None) ## tells the writer to rotate
+            self.size = len(self.header)
+            self.since_keyframe = None
+        matrix = frame.reshape(-1, 3)
+        strip = np.frombuffer(strip, dtype=np.uint8).reshape(-1, 4)
+        if self.since_keyframe is None or self.since_keyframe >= self.keyframe_interval:
+            chunks = [frame_header.pack(t, KEYFRAME, 0, 0),
+                      matrix.tobytes(), strip.tobytes()]
+            self.since_keyframe = 0
+        else:
+            mruns, mdata = encode_delta(matrix, self.matrix)
+            sruns, sdata = encode_delta(strip, self.strip)
+            chunks = [frame_header.pack(t, DELTA, mruns, sruns), mdata, sdata]
+        self.matrix[:] = matrix
+        self.strip[:] = strip
+        self.since_keyframe += 1
+        data = b"".join(chunks)
+        self.size += len(data)
+        self.queue.append(data)
+
+    def write_loop (self):
+        """body of the writer thread"""
+        while self.running:
+            sleep(self.write_interval)
+            self.write_queue()
+        self.write_queue()
+
+    def write_queue (self):
+        while self.queue:
+            data = self.queue.popleft()
+            if data is None:
+                self.rotate()
+            else:
+                self.f.write(data)
+
+    def rotate (self):
+        self.f.close()
+        for i in range(self.keep_files, 0, -1):
+            src = self.path if i == 1 else "{}.{}".format(self.path, i - 1)
+            if os.path.exists(src):
+                os.replace(src, "{}.{}".format(self.path, i))
+        self.f = open(self.path, "wb")
+        self.f.write(self.header)
+
+    def close (self):
+        if self.thread:
+            self.running = False
+            self.thread.join()
+            self.thread = None
+            self.f.close()
+
+
+class FrameReader ():
+    """
+    Iterates over a recording, yielding (t, frame, strip) for each frame,
+    where frame is an (h, w, 3) array and strip a bytearray.  The same
+    frame and strip objects are updated in place and yielded each time.
+    """
+    width = 0
+    height = 0
+    npixels = 0
+
+    def __init__ (self, path):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        tag, self.width, self.height, self.npixels = file_header.unpack_from(self.data)
+        if tag != magic:
+            raise ValueError("not a frame recording: " + path)
+
+    def __iter__ (self):
+        data = self.data
+        frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        stripbuffer = bytearray(self.npixels * 4)
+        strip = np.frombuffer(stripbuffer, dtype=np.uint8).reshape(-1, 4)
+        matrix = frame.reshape(-1, 3)
+        i = file_header.size
+        while i + frame_header.size <= len(data):
+            t, kind, mruns, sruns = frame_header.unpack_from(data, i)
+            i += frame_header.size
+            if kind == KEYFRAME:
+                matrix[:] = np.frombuffer(data, np.uint8, matrix.size, i).reshape(-1, 3)
+                i += matrix.size
+                strip[:] = np.frombuffer(data, np.uint8, strip.size, i).reshape(-1, 4)
+                i += strip.size
+            else:
+                i = decode_delta(data, i, mruns, matrix)
+                i = decode_delta(data, i, sruns, strip)
+            yield (t, frame, stripbuffer)
+
+
+def compare (patha, pathb):
+    """
+    Compare the frames of two recordings, ignoring their times, and return
+    the index of the first frame that differs, or where the shorter one
+    ends, or None.
+    """
+    a = FrameReader(patha)
+    b = FrameReader(pathb)
+    if (a.width, a.height, a.npixels) != (b.width, b.height, b.npixels):
+        return 0
+    n = 0
+    for ra, rb in zip_longest(a, b):
+        if ra is None or rb is None:
+            return n
+        _, framea, stripa = ra
+        _, frameb, stripb = rb
+        if not np.array_equal(framea, frameb) or stripa != stripb:
+            return n
+        n += 1
+    return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "compare":
+        print("Usage: framerecord.py compare <recording> <recording>")
+        sys.exit(1)
+    n = compare(sys.argv[2], sys.argv[3])
+    if n is None:
+        print("recordings match")
+    else:
+        print("recordings differ at frame {}".format(n))
+        sys.exit(1)
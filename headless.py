@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Headless benchmark for the Pond main loop.
+
+Runs the real ModeStartGame -> ModeGameplay -> ModeReset cycle against the
+null matrix and null DotStar backends from mocks.py for a fixed number of
+frames, with a scripted MCP23017 pressing the switches, and reports frame
+time percentiles per mode.
+
+Usage: headless.py <config> [frames]
+"""
+
+import os, sys
+from time import perf_counter
+import mocks
+mocks.install_matrix() ## before watershed imports rgbmatrix
+import ledstrip
+import watershed
+from AssetManager import AssetManager
+from utils import now, percentile
+
+
+class ScriptedMCP23017 (mocks.MCP23017):
+    """
+    Stand-in for the MCP23017 that presses switches according to a
+    repeating script of (seconds, pin) entries.  Each press holds the pin
+    low for press_duration seconds.
+    """
+    script = [(5.0, 6), (6.0, 7), (7.0, 6), (8.0, 6), (9.0, 7),
+              (11.0, 6), (12.0, 7), (13.0, 7), (14.0, 6), (20.0, 5)]
+    period = 30.0
+    press_duration = 0.05
+    start_time = None
+
+    def __init__ (self, *args, **kwargs):
+        super(ScriptedMCP23017, self).__init__(*args, **kwargs)
+        self.start_time = now()
+
+    def input_pins (self, pins):
+        t = (now() - self.start_time) % self.period
+        pressed = set(pin for at, pin in self.script
+                      if at <= t < at + self.press_duration)
+        return [i not in pressed for i in pins]
+
+
+def use_null_backends ():
+    """swap the hardware classes used by watershed for headless stand-ins"""
+    watershed.RGBMatrix = mocks.RGBMatrix
+    watershed.RGBMatrixOptions = mocks.RGBMatrixOptions
+    watershed.MCP23017 = ScriptedMCP23017
+    ledstrip.Adafruit_DotStar = mocks.Adafruit_DotStar
+
+
+def benchmark (pond, frames):
+    """
+    Run the pond for the given number of frames, paced like Pond.run, and
+    return a dict of per-frame work times in seconds keyed by mode name.
+    """
+    pond.start()
+    pond.spawners_ready.wait()
+    times = {}
+    for _ in range(0, frames):
+        t = pond.scheduler.wait()
+        mode = type(pond.current_mode).__name__
+        t0 = perf_counter()
+        pond.runframe(t)
+        times.setdefault(mode, []).append(perf_counter() - t0)
+    return times
+
+
+def report (times, elapsed, scheduler):
+    print("{:<16} {:>7} {:>8} {:>8} {:>8} {:>8} {:>8}".format(
+        "mode", "frames", "p50 ms", "p90 ms", "p99 ms", "max ms", "max fps"))
+    allframes = []
+    for mode, samples in sorted(times.items()):
+        allframes.extend(samples)
+        samples = sorted(samples)
+        print("{:<16} {:>7} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.0f}".format(
+            mode, len(samples),
+            percentile(samples, 50) * 1000, percentile(samples, 90) * 1000,
+            percentile(samples, 99) * 1000, samples[-1] * 1000,
+            len(samples) / sum(samples)))
+    print("{} frames in {:.1f}s: {:.1f} fps paced, {:.0f} fps unpaced".format(
+        len(allframes), elapsed, len(allframes) / elapsed,
+        len(allframes) / sum(allframes)))
+    print("{} frame deadline overruns at {} fps target".format(
+        scheduler.overruns, scheduler.frame_rate))
+
+
+if __name__ == "__main__":
+    selfdir = os.path.dirname(os.path.abspath(__file__))
+    AssetManager.root = selfdir
+    argc = len(sys.argv)
+    if argc not in (2, 3):
+        print("Usage: headless.py <config> [frames]")
+        sys.exit(1)
+    frames = int(sys.argv[2]) if argc == 3 else 3000
+    use_null_backends()
+    watershed.load_config(sys.argv[1])
+    pond = watershed.Pond()
+    start = perf_counter()
+    times = benchmark(pond, frames)
+    report(times, perf_counter() - start, pond.scheduler)
+    pond.shutdown()
+    if pond.profiler.enabled:
+        print(pond.profiler.summary())
@@ -1,10 +1,29 @@
 
+import threading
+from time import sleep
 try:
     from dotstar import Adafruit_DotStar
 except:
     from mocks import Adafruit_DotStar
 
 
+def pack_pixels (colors):
+    """strip bytes for a sequence of (r, g, b) colors"""
+    return bytes(bytearray([v for (r, g, b) in colors for v in (0xff, b, g, r)]))
+
+
+class PixelRun ():
+    """
+    A run of pixel colors pre-packed into strip byte order, both forwards
+    and reversed, for LEDStripSection.write_run.
+    """
+    def __init__ (self, colors):
+        self.colors = list(colors)
+        self.length = len(self.colors)
+        self.forward = pack_pixels(self.colors)
+        self.reverse = pack_pixels(self.colors[::-1])
+
+
 class LEDStripSection ():
     offset = 0
     length = 0
@@ -34,8 +53,51 @@ class LEDStripSection ():
         (r, g, b) = color
         self.buffer[i+1:i+4] = bytearray((b, g, r))
 
+    def raw_span (self, i, n):
+        """
+        The raw pixel range [lo, hi) that holds logical pixels i .. i+n-1,
+        and whether they are stored in reverse order.
+        """
+        v = i * self.vmul + self.voffset
+        r = v if self.direction > 0 else self.length - 1 - v
+        if self.vmul * self.direction > 0:
+            return (r, r + n, False)
+        return (r - n + 1, r + 1, True)
+
+    def write_run (self, i, run):
+        """write a PixelRun to logical pixels i .. i+run.length-1"""
+        if abs(self.vmul) != 1:
+            for k, color in enumerate(run.colors):
+                self.set_pixel(i + k, color)
+            return
+        lo, hi, reverse = self.raw_span(i, run.length)
+        a = max(lo, 0)
+        b = min(hi, self.length)
+        if a < b:
+            data = run.reverse if reverse else run.forward
+            self.buffer[a*4:b*4] = data[(a-lo)*4:(b-lo)*4]
+
+    def fill_span (self, i, n, color):
+        """set logical pixels i .. i+n-1 to color"""
+        if abs(self.vmul) != 1:
+            for k in range(0, n):
+                self.set_pixel(i + k, color)
+            return
+        lo, hi, reverse = self.raw_span(i, n)
+        a = max(lo, 0)
+        b = min(hi, self.length)
+        if a < b:
+            self.buffer[a*4:b*4] = pack_pixels([color]) * (b - a)
+
 
 class LEDStrip ():
+    """
+    The render loop draws into self.buffer, which all sections are views
+    of.  show() pushes it to the strip.  In threaded mode, show() instead
+    publishes a copy into the front buffer under a lock, and a worker
+    thread writes the front buffer to the strip at refresh_rate, so that
+    bit-banging the strip does not hold up the render loop.
+    """
     datapin = 24
     clockpin = 25
     npixels = 0
@@ -44,6 +106,16 @@ class LEDStrip ():
     sections_spec = []
     sections = None
 
+    ## threaded output
+    threaded = False
+    refresh_rate = 60
+
+    ## internal
+    front = None
+    lock = None
+    thread = None
+    running = False
+
     def __init__ (self):
         self.npixels = self.calc_npixels(self.sections_spec)
         self.strip = Adafruit_DotStar(self.npixels, self.datapin, self.clockpin)
@@ -54,6 +126,13 @@ class LEDStrip ():
         for spec in self.sections_spec:
             self.add_section(**spec)
         self.strip.begin()
+        if self.threaded:
+            self.front = bytearray(self.buffer)
+            self.lock = threading.Lock()
+            self.running = True
+            self.thread = threading.Thread(target=self.output_loop,
+                                           name="ledstrip", daemon=True)
+            self.thread.start()
 
     def calc_npixels (self, sections):
         npixels = 0
@@ -66,3 +145,31 @@ class LEDStrip ():
     def add_section (self, name = None, offset = None, length = 0,
                      direction = 1, voffset = 0, vmul = 1):
         self.sections[name] = LEDStripSection(self, offset, length, direction, voffset, vmul)
+
+    def show (self):
+        if self.thread:
+            with self.lock:
+                self.front[:] = self.buffer
+        else:
+            self.strip.show(self.buffer)
+
+    def output_loop (self):
+        """body of the output thread"""
+        period = 1.0 / self.refresh_rate
+        out = bytearray(self.front)
+        while self.running:
+            with self.lock:
+                out[:] = self.front
+            self.strip.show(out)
+            sleep(period)
+
+    def stop (self):
+        if self.thread:
+            self.running = False
+            self.thread.join()
+            self.thread = None
+
+    def clear (self):
+        self.stop()
+        self.strip.clear()
+        self.strip.show()
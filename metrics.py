@@ -0,0 +1,201 @@
+import os, select, socket, threading
+from array import array
+from time import perf_counter, sleep
+from utils import percentile
+
+class Metrics ():
+    """
+    Counters and gauges of the running pond, published at a low rate in
+    the Prometheus text format, to textfile_path (for the node exporter's
+    textfile collector) and to anyone connecting to the unix socket at
+    socket_path:
+
+        socat - UNIX-CONNECT:/run/watershed/metrics.sock
+
+    The frame loop only records frame times and counts events in memory.
+    sample(), run as a tick every interval seconds, takes a snapshot of
+    the pond for a publisher thread, which formats and writes it, so
+    nothing is formatted or written in the frame loop.
+    """
+    ## config
+    enabled = False
+    interval = 5.0
+    textfile_path = None
+    socket_path = None
+    window = 1000
+    prefix = "watershed_"
+    quantiles = (50, 90, 99)
+
+    ## internal
+    frame_times = None
+    nframes = 0
+    frame_count = 0
+    frame_total = 0.0
+    counters = None
+    last_t = None
+    last_frames = 0
+    snapshot = None
+    published = None
+    text = ""
+    server = None
+    thread = None
+    running = False
+
+    def __init__ (self):
+        self.frame_times = array("d", [0.0]) * self.window
+        self.counters = {}
+        for path in (self.textfile_path, self.socket_path):
+            if path and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.socket_path:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server.bind(self.socket_path)
+            self.server.listen(4)
+        self.running = True
+        self.thread = threading.Thread(target=self.publish_loop,
+                                       name="metrics", daemon=True)
+        self.thread.start()
+
+    def clock (self):
+        return perf_counter()
+
+    def record_frame (self, t0):
+        dt = perf_counter() - t0
+        self.frame_times[self.nframes % self.window] = dt
+        self.nframes += 1
+        self.frame_count += 1
+        self.frame_total += dt
+
+    def count (self, name, labels=()):
+        """add one to the counter name, labels a tuple of (label, value)"""
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + 1
+
+    def sample (self, pond, t):
+        """take a snapshot of the pond for the publisher thread"""
+        scheduler = pond.scheduler
+        fps = 0.0
+        if self.last_t is not None and t > self.last_t:
+            fps = (scheduler.frames - self.last_frames) / (t - self.last_t)
+        self.last_t = t
+        self.last_frames = scheduler.frames
+        mud = pond.mud
+        fill = sum(mud.height - level for level in mud.levels) / float(mud.width * mud.height)
+        gauges = [("fps", (), fps),
+                  ("health", (), pond.health),
+                  ("level", (), pond.level),
+                  ("mud_value", (), mud.value),
+                  ("mud_fill", (), fill),
+                  ("mobs", (), len(pond.mobs)),
+                  ("error", (), 1 if pond.error else 0),
+                  ("mode", (("mode", type(pond.current_mode).__name__),), 1)]
+        gauges.extend(("mob_count", (("name", name),), n)
+                      for name, n in pond.mobcounter.mobs.items())
+        gauges.extend(("startup_stage_seconds", (("stage", name),), dt)
+                      for name, dt, _ in pond.startup.timings())
+        counters = sorted(self.counters.items())
+        counters.extend([(("frames_total", ()), scheduler.frames),
+                         (("frame_overruns_total", ()), scheduler.overruns),
+                         (("switch_presses_total", ()), pond.switches.presses),
+                         (("switch_errors_total", ()), pond.switches.errors)])
+        if pond.recorder:
+            counters.append((("record_dropped_total", ()), pond.recorder.dropped))
+        times = self.frame_times[0:min(self.nframes, self.window)]
+        self.nframes = 0
+        self.snapshot = (gauges, counters, times, self.frame_count, self.frame_total)
+
+    def render (self, snapshot):
+        """the Prometheus text format of a snapshot"""
+        gauges, counters, times, count, total = snapshot
+        lines = []
+        typed = set()
+        def add (kind, name, labels, value):
+            name = self.prefix + name
+            if name not in typed:
+                typed.add(name)
+                lines.append("# TYPE {} {}".format(name, kind))
+            if labels:
+                name += "{" + ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                                       for k, v in labels) + "}"
+            lines.append("{} {}".format(name, value))
+        for name, labels, value in gauges:
+            add("gauge", name, labels, value)
+        for (name, labels), value in counters:
+            add("counter", name, labels, value)
+        times = sorted(times)
+        for q in self.quantiles:
+            add("summary", "frame_seconds", (("quantile", q / 100.0),), percentile(times, q))
+        lines.append("{}frame_seconds_sum {}".format(self.prefix, total))
+        lines.append("{}frame_seconds_count {}".format(self.prefix, count))
+        add("gauge", "frame_seconds_max", (), times[-1] if times else 0.0)
+        return "\n".join(lines) + "\n"
+
+    def publish_loop (self):
+        """body of the publisher thread"""
+        while self.running:
+            if self.server:
+                ready, _, _ = select.select([self.server], [], [], 0.25)
+            else:
+                ready = []
+                sleep(0.25)
+            snapshot = self.snapshot
+            if snapshot is not self.published:
+                self.published = snapshot
+                self.text = self.render(snapshot)
+                if self.textfile_path:
+                    try:
+                        self.write_textfile(self.text)
+                    except OSError:
+                        pass ## try again with the next snapshot
+            if ready:
+                self.serve()
+
+    def write_textfile (self, text):
+        ## write and rename, so a reader never sees a partial file
+        tmp = self.textfile_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, self.textfile_path)
+
+    def serve (self):
+        conn, _ = self.server.accept()
+        try:
+            conn.sendall(self.text.encode())
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def close (self):
+        if self.thread:
+            self.running = False
+            self.thread.join()
+            self.thread = None
+        if self.server:
+            self.server.close()
+            os.unlink(self.socket_path)
+            self.server = None
+
+
+class NullMetrics ():
+    """
+    Stand-in used when metrics are switched off.
+    """
+    enabled = False
+
+    def clock (self):
+        return 0
+
+    def record_frame (self, t0):
+        pass
+
+    def count (self, name, labels=()):
+        pass
+
+    def sample (self, pond, t):
+        pass
+
+    def close (self):
+        pass
@@ -1,6 +1,10 @@
 
-from random import random, randint, getrandbits
+from array import array
+from bisect import insort
+from collections import OrderedDict
+import numpy as np
 from utils import *
+from ledstrip import PixelRun
 
 class MobCounter ():
     mobs = None
@@ -21,6 +25,128 @@ class MobCounter ():
         else:
             self.mobs.pop(mob.name)
 
+    def set (self, name, n):
+        """set the count of name, for mobs that stand for several"""
+        if n > 0:
+            self.mobs[name] = n
+        else:
+            self.mobs.pop(name, None)
+
+
+class MobCollection ():
+    """
+    The live mobs of a pond.  Mobs are kept in buckets by z, and iterate
+    in draw order: by z, then by insertion.  Each mob is also indexed
+    under every class in its MRO, so class queries such as "is any
+    droplet alive" are constant-time.  Buckets and indexes are ordered
+    dicts used as sets, so removing a dead mob is O(1).
+    """
+    zorder = None
+    buckets = None
+    classes = None
+    size = 0
+
+    def __init__ (self):
+        self.zorder = []
+        self.buckets = {}
+        self.classes = {}
+
+    def __len__ (self):
+        return self.size
+
+    def __iter__ (self):
+        for z in self.zorder:
+            for mob in self.buckets[z]:
+                yield mob
+
+    def add (self, mob):
+        bucket = self.buckets.get(mob.z)
+        if bucket is None:
+            bucket = self.buckets[mob.z] = OrderedDict()
+            insort(self.zorder, mob.z)
+        bucket[mob] = None
+        for cls in type(mob).__mro__[:-1]:
+            index = self.classes.get(cls)
+            if index is None:
+                index = self.classes[cls] = OrderedDict()
+            index[mob] = None
+        self.size += 1
+
+    def remove (self, mob):
+        del self.buckets[mob.z][mob]
+        for cls in type(mob).__mro__[:-1]:
+            del self.classes[cls][mob]
+        self.size -= 1
+
+    def count (self, cls):
+        index = self.classes.get(cls)
+        return len(index) if index else 0
+
+    def first (self, cls):
+        index = self.classes.get(cls)
+        return next(iter(index)) if index else None
+
+
+class Trail ():
+    """
+    Fixed-capacity ring buffer of the positions a mob has visited, kept in
+    compact arrays.  A position visited on consecutive frames is stored
+    once, with the time of the latest visit.  When full, the oldest entry
+    is overwritten.
+    """
+    capacity = 0
+    start = 0
+    count = 0
+    total = 0 ## distinct positions ever appended
+
+    def __init__ (self, capacity):
+        self.capacity = capacity
+        self.xs = array("h", [0]) * capacity
+        self.ys = array("h", [0]) * capacity
+        self.ts = array("d", [0.0]) * capacity
+
+    def __len__ (self):
+        return self.count
+
+    def __iter__ (self):
+        """yield (x, y, t) oldest first"""
+        capacity = self.capacity
+        xs, ys, ts = self.xs, self.ys, self.ts
+        for k in range(self.start, self.start + self.count):
+            i = k % capacity
+            yield (xs[i], ys[i], ts[i])
+
+    def append (self, position, t):
+        x, y = position
+        if self.count:
+            last = (self.start + self.count - 1) % self.capacity
+            if self.xs[last] == x and self.ys[last] == y:
+                self.ts[last] = t
+                return
+        if self.count == self.capacity:
+            i = self.start
+            self.start = (self.start + 1) % self.capacity
+        else:
+            i = (self.start + self.count) % self.capacity
+            self.count += 1
+        self.xs[i] = x
+        self.ys[i] = y
+        self.ts[i] = t
+        self.total += 1
+
+    def arrays (self):
+        """numpy arrays (xs, ys, ts) of the entries, oldest first"""
+        i = np.arange(self.start, self.start + self.count) % self.capacity
+        return (np.frombuffer(self.xs, dtype=np.int16)[i],
+                np.frombuffer(self.ys, dtype=np.int16)[i],
+                np.frombuffer(self.ts, dtype=np.float64)[i])
+
+    def expire (self, cutoff):
+        """drop the entries last visited before cutoff"""
+        while self.count and self.ts[self.start] < cutoff:
+            self.start = (self.start + 1) % self.capacity
+            self.count -= 1
+
 
 class Mob ():
     """
@@ -74,23 +200,29 @@ class LEDStripMob (Mob):
     start_x = 32
     airspeed = (0, 8)
     waterspeed = (0, 5)
+    trail_capacity = 64
     matrix_trail = None
+    tail_runs = {}
 
     def __init__ (self, pond, t):
         super(LEDStripMob, self).__init__(pond, t)
         self.speed = self.airspeed
-        self.matrix_trail = []
+        self.matrix_trail = Trail(self.trail_capacity)
         self.stripsection = pond.ledstrip.sections[self.name]
         self.start_position = (self.start_x, -(self.stripsection.length))
 
+    def strip_tail (self):
+        """the packed tail, from the black pixel behind it up to the head"""
+        key = (self.color, self.length)
+        run = LEDStripMob.tail_runs.get(key)
+        if run is None:
+            steps = gradients.darken_steps(self.color, self.length)
+            run = LEDStripMob.tail_runs[key] = PixelRun([(0, 0, 0)] + steps[::-1])
+        return run
+
     def draw_on_strip (self):
-        s = self.stripsection
         x, y = self.position
-        for i in range(0, self.length):
-            dim = (self.length - i) / self.length
-            c = color_darken(self.color, dim)
-            s.set_pixel(y - i, c)
-        s.set_pixel(y - self.length, (0, 0, 0))
+        self.stripsection.write_run(y - self.length, self.strip_tail())
 
 
 class Droplet (LEDStripMob):
@@ -107,24 +239,25 @@ class Droplet (LEDStripMob):
     entered_mud_time = None
 
     def draw_on_matrix (self, pond, t):
-        trail_length = len(self.matrix_trail)
+        trail = self.matrix_trail
+        trail.expire(t - self.trailfadetime)
 
         ## trail
-        for i,((tx,ty),tt) in enumerate(self.matrix_trail):
-            factor = (t - tt) / self.trailfadetime
-            if factor < 1.0:
-                if ty < pond.level_px:
-                    bgcolor = (0, 0, 0)
-                else:
-                    bgcolor = pond.watercolor
-                tcolor = color_blend(self.color, bgcolor, factor)
-                pond.canvas.putpixel((tx, ty), tcolor)
+        if trail:
+            xs, ys, ts = trail.arrays()
+            factors = (t - ts) / self.trailfadetime
+            keep = factors < 1.0
+            i = gradients.indices(factors)
+            colors = np.where((ys < pond.level_px)[:, np.newaxis],
+                              gradients.table(self.color, (0, 0, 0))[i],
+                              gradients.table(self.color, pond.watercolor)[i])
+            pond.compositor.pixels(xs[keep], ys[keep], colors[keep])
 
         ## lead pixel
-        pond.canvas.putpixel(self.position, self.color)
+        pond.compositor.pixel(self.position, self.color)
         x, y = self.position
         #if y < pond.level_px:
-        self.matrix_trail.append((self.position, t))
+        self.matrix_trail.append(self.position, t)
 
 
     ## Public Interface
@@ -148,8 +281,8 @@ class Droplet (LEDStripMob):
             ## need to wait self.trailfadetime
             self.entered_mud_time = self.entered_mud_time or t
             self.change_trajectory(t, (0, 0))
-            ox = randint(-1,1)
-            oy = randint(-1,0)
+            ox = rng.randint(-1,1)
+            oy = rng.randint(-1,0)
             pond.mud.add(self, (ox, oy))
         return True
 
@@ -0,0 +1,160 @@
+import atexit, os, signal, sys, threading
+from array import array
+from time import perf_counter
+from utils import percentile
+
+class PhaseStats ():
+    """
+    Rolling window of the most recent durations of one phase of the frame,
+    plus lifetime totals.
+    """
+    buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02)
+
+    def __init__ (self, window):
+        self.window = window
+        self.samples = array("d", [0.0]) * window
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add (self, dt):
+        self.samples[self.count % self.window] = dt
+        self.count += 1
+        self.total += dt
+        if dt > self.max:
+            self.max = dt
+
+    def recent (self):
+        return sorted(self.samples[0:min(self.count, self.window)])
+
+    def histogram (self, samples):
+        counts = [0] * (len(self.buckets) + 1)
+        i = 0
+        for dt in samples: ## sorted, so walk the buckets once
+            while i < len(self.buckets) and dt >= self.buckets[i]:
+                i += 1
+            counts[i] += 1
+        return counts
+
+
+class Profiler ():
+    """
+    Low-overhead per-phase frame timing.  Call sites take a timestamp with
+    clock() and pass it to record(), which returns a fresh timestamp so
+    consecutive phases can be chained:
+
+        t0 = prof.clock()
+        pond.draw_bg()
+        t0 = prof.record("draw_bg", t0)
+
+    A summary is written on dump_signal, and to dump_path at exit,
+    including on SIGTERM.
+    """
+    ## config
+    enabled = False
+    window = 1000
+    dump_path = None
+    dump_signal = signal.SIGUSR1
+
+    ## internal
+    phases = None
+    previous_term = None
+
+    def __init__ (self):
+        self.phases = {}
+
+    def clock (self):
+        return perf_counter()
+
+    def record (self, name, t0):
+        t1 = perf_counter()
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats(self.window)
+        stats.add(t1 - t0)
+        return t1
+
+    def install (self):
+        signal.signal(self.dump_signal, lambda signum, frame: self.dump())
+        if self.dump_path:
+            atexit.register(self.dump)
+            self.previous_term = signal.signal(signal.SIGTERM, self.on_term)
+
+    def on_term (self, signum, frame):
+        """dump on SIGTERM, which skips atexit, then handle it as before"""
+        self.dump()
+        previous = self.previous_term
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    def summary (self):
+        lines = ["{:<24} {:>8} {:>8} {:>8} {:>8} {:>8}  {}".format(
+            "phase", "count", "mean ms", "p50 ms", "p99 ms", "max ms",
+            "histogram <" + " <".join("{:g}".format(b * 1000) for b in PhaseStats.buckets) + " ms")]
+        for name, stats in sorted(self.phases.items()):
+            samples = stats.recent()
+            lines.append("{:<24} {:>8} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.3f}  {}".format(
+                name, stats.count, stats.total / stats.count * 1000,
+                percentile(samples, 50) * 1000, percentile(samples, 99) * 1000,
+                stats.max * 1000,
+                " ".join(str(n) for n in stats.histogram(samples))))
+        return "\n".join(lines) + "\n"
+
+    def dump (self):
+        summary = self.summary()
+        if self.dump_path:
+            with open(self.dump_path, "w") as f:
+                f.write(summary)
+        else:
+            sys.stderr.write(summary)
+            sys.stderr.flush()
+
+
+class NullProfiler ():
+    """
+    Stand-in used when profiling is switched off.
+    """
+    enabled = False
+
+    def clock (self):
+        return 0
+
+    def record (self, name, t0):
+        return 0
+
+    def install (self):
+        pass
+
+
+class StartupTimer ():
+    """
+    Times the stages of startup, each from the end of the previous stage
+    on the same thread, and reports them with the time since boot.
+    """
+    def __init__ (self):
+        self.boot = perf_counter()
+        self.stages = []
+        self.lock = threading.Lock()
+
+    def clock (self):
+        return perf_counter()
+
+    def stage (self, name, t0):
+        t1 = perf_counter()
+        with self.lock:
+            self.stages.append((name, t1 - t0, t1 - self.boot))
+        return t1
+
+    def timings (self):
+        """(name, seconds, seconds since boot) of each stage so far"""
+        with self.lock:
+            return list(self.stages)
+
+    def report (self):
+        stages = self.timings()
+        lines = ["startup: {:<24} {:>8.1f} ms  (at {:.1f} ms)".format(name, dt * 1000, at * 1000)
+                 for name, dt, at in stages]
+        return "\n".join(lines) + "\n"
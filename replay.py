@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Plays back a recording made with Pond.record_path to the matrix and the
+LED strip, without running the game.  Frames are shown at their recorded
+times, or as fast as possible with --fast.  With --null the null
+backends from mocks.py are used instead of the hardware.
+
+The config, if given, supplies the LED strip pins and the matrix options.
+
+Usage: replay.py [--fast] [--null] <recording> [config]
+"""
+
+import sys
+from time import sleep, time
+from PIL import Image
+if "--null" in sys.argv:
+    import mocks
+    mocks.install_matrix() ## before watershed imports rgbmatrix
+import ledstrip
+import watershed
+from framerecord import FrameReader
+
+
+def replay (path, fast=False):
+    """show each frame of the recording and return the number of frames"""
+    reader = FrameReader(path)
+    matrix = watershed.RGBMatrix(options = watershed.Pond.matrix_options())
+    double_buffer = matrix.CreateFrameCanvas()
+    strip = ledstrip.Adafruit_DotStar(reader.npixels, watershed.LEDStrip.datapin,
+                                      watershed.LEDStrip.clockpin)
+    strip.begin()
+    start = None
+    n = 0
+    for t, frame, stripbuffer in reader:
+        if not fast:
+            if start is None:
+                start = (time(), t)
+            delay = start[0] + (t - start[1]) - time()
+            if delay > 0:
+                sleep(delay)
+        double_buffer.SetImage(Image.fromarray(frame))
+        double_buffer = matrix.SwapOnVSync(double_buffer)
+        strip.show(stripbuffer)
+        n += 1
+    strip.clear()
+    strip.show()
+    return n
+
+
+if __name__ == "__main__":
+    flags = [a for a in sys.argv[1:] if a.startswith("--")]
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if len(args) not in (1, 2) or not set(flags) <= set(["--fast", "--null"]):
+        print("Usage: replay.py [--fast] [--null] <recording> [config]")
+        sys.exit(1)
+    if "--null" in flags:
+        import headless
+        headless.use_null_backends()
+    if len(args) == 2:
+        watershed.load_config(args[1])
+    start = time()
+    try:
+        n = replay(args[0], fast="--fast" in flags)
+    except KeyboardInterrupt:
+        sys.exit(0)
+    elapsed = time() - start
+    print("{} frames in {:.1f}s: {:.1f} fps".format(n, elapsed, n / max(elapsed, 1e-9)))
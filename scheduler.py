@@ -0,0 +1,84 @@
+import utils
+from profiler import NullProfiler
+
+class Tick ():
+    """
+    A subsystem update that runs on its own fixed period.  If the frame
+    loop falls behind, a late tick runs once and is rescheduled from the
+    current time rather than running again for every period it missed.
+    """
+    name = None
+    period = 0
+    fn = None
+    next_due = None
+    skipped = 0
+
+    def __init__ (self, name, period, fn):
+        self.name = name
+        self.period = period
+        self.fn = fn
+
+    def run (self, t):
+        if self.next_due is None:
+            self.next_due = t
+        if t < self.next_due:
+            return False
+        self.fn(t)
+        self.next_due += self.period
+        if self.next_due <= t:
+            self.skipped += int((t - self.next_due) / self.period) + 1
+            self.next_due = t + self.period
+        return True
+
+
+class FrameScheduler ():
+    """
+    Paces the main loop at a target frame rate by sleeping only for the
+    time left until the next frame deadline, and counts the frames that
+    overran their deadline.  Also runs the lower-rate subsystem ticks.
+    """
+    frame_rate = 0
+    period = 0
+    next_frame = None
+    frames = 0
+    overruns = 0
+    ticks = None
+    profiler = None
+
+    def __init__ (self, frame_rate, profiler=None):
+        self.frame_rate = frame_rate
+        self.period = 1.0 / frame_rate
+        self.ticks = []
+        self.profiler = profiler or NullProfiler()
+
+    def add_tick (self, name, period, fn):
+        tick = Tick(name, period, fn)
+        self.ticks.append(tick)
+        return tick
+
+    def next_delay (self):
+        """move on to the next frame deadline and return the time until it"""
+        now = utils.now()
+        if self.next_frame is None:
+            self.next_frame = now
+        delay = self.next_frame - now
+        if delay > 0:
+            self.next_frame += self.period
+        else:
+            if self.frames > 0:
+                self.overruns += 1
+            self.next_frame = now + self.period
+        self.frames += 1
+        return delay
+
+    def wait (self):
+        """sleep until the next frame deadline and return the frame time"""
+        utils.clock.sleep(self.next_delay())
+        return utils.now()
+
+    def run_ticks (self, t):
+        prof = self.profiler
+        for tick in self.ticks:
+            t0 = prof.clock()
+            if tick.run(t):
+                prof.record(tick.name, t0)
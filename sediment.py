@@ -0,0 +1,40 @@
+## materials in the sediment
+EMPTY = 0
+GOOD = 1
+BAD = 2
+
+class SedimentCounter ():
+    """
+    Running counts of the good and bad sediment in the mud, in total and
+    per column.  The mud engines report every add, move and decay, so the
+    counts are always current without scanning the pile.
+    """
+    good = 0
+    bad = 0
+    columns = None
+
+    def __init__ (self, width):
+        self.columns = [0] * width
+
+    @property
+    def value (self):
+        """good minus bad sediment"""
+        return self.good - self.bad
+
+    def add (self, x, material):
+        if material == GOOD:
+            self.good += 1
+        else:
+            self.bad += 1
+        self.columns[x] += 1
+
+    def remove (self, x, material):
+        if material == GOOD:
+            self.good -= 1
+        else:
+            self.bad -= 1
+        self.columns[x] -= 1
+
+    def move (self, x1, x2):
+        self.columns[x1] -= 1
+        self.columns[x2] += 1
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Deterministic simulation of the pond.
+
+Runs the full Pond, Mode and mob pipeline against the null backends of
+headless.py on a virtual clock, with a seeded random number generator and
+no threads, as fast as the frames can be computed.  The scripted switch
+presses of headless.py follow the virtual clock too, so a given config,
+seed and duration produce the same frames on every run.  A digest of
+every frame is printed at each report interval and at the end, so two
+runs can be compared at a glance; --record saves the frames themselves
+for framerecord.py compare.
+
+Usage: simulate.py [--seed N] [--fps N] [--report SECONDS] [--record PATH]
+                   <config> <seconds>
+"""
+
+import hashlib, os, sys
+from time import perf_counter
+import headless
+import utils
+import watershed
+from AssetManager import AssetManager
+from framerecord import FrameRecorder
+
+
+def simulate (pond, duration, report_interval=600.0):
+    """
+    Run the pond for duration seconds of virtual time, printing the
+    running frame digest every report_interval seconds, and return the
+    number of frames and the final digest.
+    """
+    digest = hashlib.sha1()
+    pond.start()
+    start = utils.now()
+    next_report = start + report_interval
+    frames = 0
+    while True:
+        t = pond.scheduler.wait()
+        if t - start >= duration:
+            break
+        pond.runframe(t)
+        digest.update(pond.compositor.frame)
+        digest.update(pond.ledstrip.buffer)
+        frames += 1
+        if t >= next_report:
+            next_report += report_interval
+            print("[{:8.0f}s] frames:{} h:{:4.2f} mud:{} {}".format(
+                t - start, frames, pond.health, pond.mud.value, digest.hexdigest()))
+    return frames, digest.hexdigest()
+
+
+if __name__ == "__main__":
+    options = {"--seed": "0", "--fps": None, "--report": "600", "--record": None}
+    args = []
+    argv = sys.argv[1:]
+    while argv:
+        a = argv.pop(0)
+        if a in options and argv:
+            options[a] = argv.pop(0)
+        else:
+            args.append(a)
+    if len(args) != 2 or args[0].startswith("--"):
+        print("Usage: simulate.py [--seed N] [--fps N] [--report SECONDS] [--record PATH]\n"
+              "                   <config> <seconds>")
+        sys.exit(1)
+    selfdir = os.path.dirname(os.path.abspath(__file__))
+    AssetManager.root = selfdir
+    headless.use_null_backends()
+    watershed.load_config(args[0])
+
+    ## no threads, so that nothing depends on how they are scheduled
+    watershed.Switches.threaded = False
+    watershed.LEDStrip.threaded = False
+    watershed.Pond.background_init = False
+    watershed.Metrics.enabled = False
+    watershed.Pond.status_interval = None
+    if options["--fps"]:
+        watershed.Pond.frame_rate = float(options["--fps"])
+    watershed.Pond.record_path = options["--record"]
+    ## faster than real time, so the writer must not drop frames
+    FrameRecorder.queue_limit = None
+    utils.set_clock(utils.VirtualClock())
+    utils.rng.seed(int(options["--seed"]))
+
+    pond = watershed.Pond()
+    duration = float(args[1])
+    wallstart = perf_counter()
+    frames, digest = simulate(pond, duration, float(options["--report"]))
+    elapsed = perf_counter() - wallstart
+    pond.shutdown()
+    print("{} frames, {:.0f}s simulated in {:.1f}s ({:.0f}x real time)".format(
+        frames, duration, elapsed, duration / elapsed))
+    print("digest {}".format(digest))
@@ -1,5 +1,9 @@
 
 from math import *
+from collections import OrderedDict
+import random as _random
+import time as _time
+import numpy as np
 
 tau = asin(1.0) * 4 ## not needed if python >= 3.6
 
@@ -24,3 +28,113 @@ def color_blend (color1, color2, factor):
     g3 = int((g2 - g1) * factor + g1)
     b3 = int((b2 - b1) * factor + b1)
     return (r3, g3, b3)
+
+
+class GradientCache ():
+    """
+    Quantized lookup tables for color_blend between pairs of colors, and
+    for the darken steps of a color over a length.  Tables are built on
+    first use and kept in least-recently-used order up to max_tables.
+    evict(color) drops every table involving a color, such as a water
+    color that pond health has moved away from.
+    """
+    steps = 64
+    max_tables = 64
+    tables = None
+
+    def __init__ (self):
+        self.tables = OrderedDict()
+
+    def lookup (self, key, build):
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = build()
+            while len(self.tables) > self.max_tables:
+                self.tables.popitem(last=False)
+        else:
+            self.tables.move_to_end(key)
+        return table
+
+    def table (self, color1, color2):
+        """(steps + 1, 3) array blending color1 into color2"""
+        def build ():
+            c1 = np.array(color1, dtype=np.float64)
+            c2 = np.array(color2, dtype=np.float64)
+            factors = np.arange(self.steps + 1) / self.steps
+            return ((c2 - c1) * factors[:, np.newaxis] + c1).astype(np.uint8)
+        return self.lookup((tuple(color1), tuple(color2)), build)
+
+    def indices (self, factors):
+        return np.clip((factors * self.steps).astype(int), 0, self.steps)
+
+    def blend (self, color1, color2, factor):
+        i = min(max(int(factor * self.steps), 0), self.steps)
+        return tuple(self.table(color1, color2)[i].tolist())
+
+    def blend_array (self, color1, color2, factors):
+        """blend for an array of factors, returning an (n, 3) array"""
+        return self.table(color1, color2)[self.indices(factors)]
+
+    def darken_steps (self, color, length):
+        """[color_darken(color, (length - i) / length) for i in range(length)]"""
+        return self.lookup(("darken", tuple(color), length),
+                           lambda: [color_darken(color, (length - i) / length)
+                                    for i in range(0, length)])
+
+    def evict (self, color):
+        color = tuple(color)
+        for key in [k for k in self.tables if color in k]:
+            del self.tables[key]
+
+
+gradients = GradientCache()
+
+
+class Clock ():
+    """the wall clock"""
+    def time (self):
+        return _time.time()
+
+    def sleep (self, seconds):
+        if seconds > 0:
+            _time.sleep(seconds)
+
+
+class VirtualClock ():
+    """
+    A clock that only moves when it is slept, so that a simulation runs
+    as fast as it can compute frames and every run sees the same times.
+    """
+    t = 0.0
+
+    def __init__ (self, start=0.0):
+        self.t = start
+
+    def time (self):
+        return self.t
+
+    def sleep (self, seconds):
+        if seconds > 0:
+            self.t += seconds
+
+
+## game code reads the time with now() and takes random numbers from rng,
+## so that a simulation can swap in a VirtualClock and seed rng.  Threads
+## that talk to hardware keep to the wall clock.
+clock = Clock()
+rng = _random.Random()
+
+def now ():
+    return clock.time()
+
+def set_clock (c):
+    global clock
+    clock = c
+
+
+def percentile (values, p):
+    """p-th percentile (0-100) of an already sorted sequence"""
+    if not values:
+        return 0.0
+    i = min(len(values) - 1, int(p / 100.0 * len(values)))
+    return values[i]
@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 
 import os, sys
+import threading
+from collections import deque
 from math import *
-from time import sleep, time
-from random import random, randint, getrandbits
+from time import time
 from rgbmatrix import RGBMatrix, RGBMatrixOptions
-from PIL import Image, ImageDraw
+from PIL import Image
+import numpy as np
 try:
     import Adafruit_GPIO as GPIO
 except:
@@ -15,6 +17,12 @@ try:
 except:
     from mocks import MCP23017
 from AssetManager import AssetManager
+from scheduler import FrameScheduler
+from profiler import Profiler, NullProfiler, StartupTimer
+from metrics import Metrics, NullMetrics
+from compositor import Compositor
+from sediment import SedimentCounter, GOOD, BAD
+from framerecord import FrameRecorder
 
 
 from utils import *
@@ -24,40 +32,72 @@ from mobs import *
 version = (2, 0, 0)
 
 
+class WaveProfile ():
+    """
+    Shape and speed of the wave: amplitude scales the brightness (0-1),
+    a higher exponent lowers the troughs, and speed is in pixels per
+    second.
+    """
+    def __init__ (self, amplitude=1.0, exponent=2, speed=5.0):
+        self.amplitude = amplitude
+        self.exponent = exponent
+        self.speed = speed
+
+
 class Wave ():
-    length = 0
-    interval = 0.2
-    last_update = 0
-    stripsection = None
+    """
+    The wave on the LED strip.  For each profile, the strip bytes of every
+    phase of one tile are precomputed once as slices of a single pattern
+    buffer, so update only copies the current phase into the section.
+    """
+    ## config
+    interval = 0.05 ## how often to check for a new phase
     tilelength = 16
-    tileoffset = 0
+    profiles = { "default": WaveProfile(1.0, 2, 5.0) }
+    profile = "default"
+
+    ## internal
+    stripsection = None
+    frames = None
+    phase = None
+    position = 0.0
+    last_t = None
 
     def __init__ (self, stripsection):
         self.stripsection = stripsection
-        length = self.stripsection.length
-        self.tileoffset = length - 1 % self.tilelength
-        for i in range(0, length):
-            self.stripsection.set_pixel(i, self.get_color_for_pixel(i))
-        buffersize = length * 4
-        self.fr = memoryview(self.stripsection.buffer)[4:buffersize]
-        self.to = memoryview(self.stripsection.buffer)[0:buffersize - 4]
-        self.lst = memoryview(self.stripsection.buffer)[buffersize - 4:]
-        last_update = time()
-
-    def get_color_for_pixel (self, i):
-        ## to lower the troughs, use a higher exponent.
-        norm = (sin(i / self.tilelength * tau) * 0.5 + 0.5) ** 2
-        b = int(norm * 255)
+        self.frames = {}
+        self.set_profile(self.profile)
+        self.stripsection.buffer[:] = self.frames[self.profile][0]
+
+    def get_color_for_pixel (self, i, profile):
+        norm = (sin(i / self.tilelength * tau) * 0.5 + 0.5) ** profile.exponent
+        b = min(255, int(norm * profile.amplitude * 255))
         return (0, 0, b)
 
+    def render_frames (self, profile):
+        length = self.stripsection.length
+        pattern = bytearray((length + self.tilelength) * 4)
+        for i in range(0, length + self.tilelength):
+            (r, g, b) = self.get_color_for_pixel(i, profile)
+            pattern[i*4:i*4+4] = bytearray((0xff, b, g, r))
+        pattern = memoryview(bytes(pattern))
+        return [pattern[p*4:(p+length)*4] for p in range(0, self.tilelength)]
+
+    def set_profile (self, name):
+        """switch to another entry of self.profiles"""
+        if name not in self.frames:
+            self.frames[name] = self.render_frames(self.profiles[name])
+        self.profile = name
+        self.phase = None
+
     def update (self, t):
-        if t < self.last_update + self.interval:
-            return
-        self.last_update = time()
-        self.to[:] = self.fr[:]
-        self.tileoffset = (self.tileoffset + 1) % self.tilelength
-        (r, g, b) = self.get_color_for_pixel(self.tileoffset)
-        self.lst[1:] = bytearray((b, g, r))
+        if self.last_t is not None:
+            self.position += (t - self.last_t) * self.profiles[self.profile].speed
+        self.last_t = t
+        phase = int(self.position) % self.tilelength
+        if phase != self.phase:
+            self.phase = phase
+            self.stripsection.buffer[:] = self.frames[self.profile][phase]
 
 
 class Switches ():
@@ -65,6 +105,15 @@ class Switches ():
     ##
     i2c_address = 0x20
     throttle = 0.5
+    poll_interval = 0.02
+
+    ## threaded input: sample the pins on a background thread and queue
+    ## debounced presses for poll to dispatch
+    threaded = False
+    sample_interval = 0.005
+    debounce = 0.02
+    reconnect_backoff = 0.5
+    reconnect_backoff_max = 30.0
 
     ## internal
     ##
@@ -73,27 +122,108 @@ class Switches ():
     last_poll = None
     bindings = None
     last_press = time()
+    events = None
+    health = None
+    backoff = None
+    last_change = None
+    thread = None
+    stopping = None
+    presses = 0
+    errors = 0
 
     def __init__ (self):
         self.last_poll = tuple([True for _ in range(0, 16)])
         self.bindings = {}
-        self.ioexpander = MCP23017(address = self.i2c_address)
+        if self.threaded:
+            self.start_sampling()
+            self.stopping = threading.Event()
+            self.thread = threading.Thread(target=self.sample_loop,
+                                           name="switches", daemon=True)
+            self.thread.start()
+        else:
+            self.connect()
+
+    def start_sampling (self):
+        """queue presses found by sample for poll to dispatch"""
+        self.events = deque()
+        self.backoff = self.reconnect_backoff
+        self.last_change = [0.0] * 16
+
+    def connect (self):
+        self.last_init_attempt = time()
+        ioexpander = MCP23017(address = self.i2c_address)
         for i in range(0, 16):
-            self.ioexpander.setup(i, GPIO.IN)
-            self.ioexpander.pullup(i, True)
+            ioexpander.setup(i, GPIO.IN)
+            ioexpander.pullup(i, True)
+        self.ioexpander = ioexpander
+
+    def press (self, i, t):
+        self.presses += 1
+        if self.last_press < t - self.throttle:
+            self.last_press = t
+            if i in self.bindings:
+                self.bindings[i]()
 
     def poll (self, t):
+        if self.events is not None:
+            ## sampled: dispatch what sample queued
+            while self.events:
+                self.press(self.events.popleft(), t)
+            if self.health:
+                raise self.health
+            return
         try:
             state = self.ioexpander.input_pins(range(0, 16))
         except OSError as e:
+            self.errors += 1
             raise GameError("switches.poll failed", (0x33, 0x11, 0))
         for i,(now,prev) in enumerate(zip(state, self.last_poll)):
-            if now is False and prev is True and self.last_press < t - self.throttle:
-                self.last_press = t
-                if i in self.bindings:
-                    self.bindings[i]()
+            if now is False and prev is True:
+                self.press(i, t)
         self.last_poll = state
 
+    def sample (self):
+        """
+        Read the pins once and queue debounced presses.  Returns how long
+        to wait before the next sample, which backs off while the chip
+        cannot be reached.
+        """
+        try:
+            if self.ioexpander is None:
+                self.connect()
+            state = self.ioexpander.input_pins(range(0, 16))
+        except OSError as e:
+            self.errors += 1
+            self.health = GameError("switches.poll failed", (0x33, 0x11, 0))
+            self.ioexpander = None
+            backoff = self.backoff
+            self.backoff = min(backoff * 2, self.reconnect_backoff_max)
+            return backoff
+        self.health = None
+        self.backoff = self.reconnect_backoff
+        t = time()
+        for i,(now,prev) in enumerate(zip(state, self.last_poll)):
+            if now != prev:
+                ## a press is a falling edge after the pin was stable
+                if now is False and t - self.last_change[i] >= self.debounce:
+                    self.events.append(i)
+                self.last_change[i] = t
+        self.last_poll = state
+        return self.sample_interval
+
+    def sample_loop (self):
+        """body of the input thread"""
+        ## wait on stopping rather than sleep, so that stop need not wait
+        ## out a reconnect backoff
+        while not self.stopping.wait(self.sample()):
+            pass
+
+    def stop (self):
+        if self.thread:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+
     def bind (self, i, thunk):
         self.bindings[i] = thunk
 
@@ -102,21 +232,55 @@ class Switches ():
 
 
 class Mud ():
+    """
+    The pile of droplets.  Each runphysics tick begins a settling pass
+    over the columns, lowest pile first, and step settles a budget of
+    those columns every frame, so that a pass is spread over the frames of
+    update_rate.  Columns that did not change in their last pass, and
+    whose neighbors have not changed since, are left out of the next one.
+    value, the good minus the bad sediment, is kept current by sediment.
+    """
     ## config
     update_rate = 0.75
     decay = None
+    columns_per_frame = None ## None to spread each pass over update_rate
 
     ## internal
-    lastupdate = time()
-    value = 0
+    width = 0
+    height = 0
+    sediment = None
     levels = None
     canvas = None
     mask = None
+    rgb = None
+    alpha = None
+    pending = None
+    dirty = None
+    budget = 0
 
-    def __init__ (self):
-        self.levels = [32] * 64
-        self.canvas = Image.new("RGB", (64, 32))
-        self.mask = Image.new("1", (64, 32))
+    def __init__ (self, width=64, height=32):
+        self.width = width
+        self.height = height
+        self.reset()
+
+    def reset (self):
+        """clear away all the sediment, for a new game"""
+        self.levels = [self.height] * self.width
+        self.canvas = Image.new("RGB", (self.width, self.height))
+        self.mask = Image.new("1", (self.width, self.height))
+        self.rgb = None
+        self.pending = deque()
+        self.dirty = set()
+        self.budget = 0
+        self.sediment = SedimentCounter(self.width)
+
+    @property
+    def value (self):
+        return self.sediment.value
+
+    @staticmethod
+    def material (color):
+        return GOOD if color == GoodDroplet.color else BAD
 
     def add (self, droplet, offset=(0,0)):
         ox, oy = offset
@@ -125,63 +289,99 @@ class Mud ():
         y += oy
         y = self.levels[x] = max(2, min(self.levels[x], y))
         if y >= 0:
+            if self.mask.getpixel((x, y)):
+                self.sediment.remove(x, self.material(self.canvas.getpixel((x, y))))
+            self.sediment.add(x, self.material(droplet.color))
             self.canvas.putpixel((x, y), droplet.color)
             self.mask.putpixel((x, y), 255)
+            self.rgb = None
+            self.dirty.add(x)
 
     def runphysics (self, pond, t):
-        cols = sorted(enumerate(self.levels), key=lambda x: x[1], reverse=True)
-        ## we compute the value based on the colors that we find in this
-        ## loop. it's not elegant but it's simple and straightforward.
-        value = 0
-        for x,level in cols:
-            sp = None
-            newlevel = level
-            for y in range(31, max(0, level - 1), -1):
-                c = self.canvas.getpixel((x, y))
-                if c == (0,0,0):                 ## space
-                    sp = y ## if multiple spaces, this will be the top one
-                elif self.decay and random() < self.decay: ## random decay
-                    ## make a hole but don't fill it in this frame
+        """begin a settling pass, finishing the last one if it is behind"""
+        self.finish_pass()
+        if self.decay: ## any column with sediment can decay
+            self.dirty.update(x for x, level in enumerate(self.levels) if level < self.height)
+        self.pending = deque(sorted(self.dirty, key=lambda x: (-self.levels[x], x)))
+        self.dirty = set()
+        frames = max(1, self.update_rate * pond.frame_rate)
+        self.budget = self.columns_per_frame or int(ceil(len(self.pending) / frames))
+
+    def step (self, pond, t):
+        """settle this frame's share of the current pass"""
+        n = self.budget
+        while self.pending and n > 0:
+            self.settle(self.pending.popleft())
+            n -= 1
+
+    def finish_pass (self):
+        while self.pending:
+            self.settle(self.pending.popleft())
+
+    def settle (self, x):
+        level = self.levels[x]
+        sp = None
+        newlevel = level
+        changed = False
+        for y in range(self.height - 1, max(0, level - 1), -1):
+            c = self.canvas.getpixel((x, y))
+            if c == (0,0,0):                 ## space
+                sp = y ## if multiple spaces, this will be the top one
+            elif self.decay and rng.random() < self.decay: ## random decay
+                ## make a hole but don't fill it in this frame
+                self.sediment.remove(x, self.material(c))
+                self.canvas.putpixel((x, y), (0, 0, 0))
+                self.mask.putpixel((x, y), 0)
+                newlevel = y + 1
+                changed = True
+            elif sp is not None: ## fall down
+                self.canvas.putpixel((x, y), (0, 0, 0))
+                self.mask.putpixel((x, y), 0)
+                self.canvas.putpixel((x, y + 1), c)
+                self.mask.putpixel((x, y + 1), 255)
+                sp = y
+                newlevel = y + 1
+                changed = True
+            else: ## fall diagonally
+                left = x > 0 and self.levels[x - 1] > y + 1
+                right = x < self.width - 1 and self.levels[x + 1] > y + 1
+                if left and right:
+                    left = left and bool(rng.getrandbits(1))
+                y2 = y + 1
+                if left:
+                    x2 = x - 1
+                elif right:
+                    x2 = x + 1
+                else:
+                    newlevel = y
+                if left or right:
                     self.canvas.putpixel((x, y), (0, 0, 0))
                     self.mask.putpixel((x, y), 0)
-                    newlevel = y + 1
-                elif sp is not None: ## fall down
-                    value += 1 if c == GoodDroplet.color else -1
-                    self.canvas.putpixel((x, y), (0, 0, 0))
-                    self.mask.putpixel((x, y), 0)
-                    self.canvas.putpixel((x, y + 1), c)
-                    self.mask.putpixel((x, y + 1), 255)
+                    self.canvas.putpixel((x2, y2), c)
+                    self.mask.putpixel((x2, y2), 255)
+                    self.levels[x2] = y2
+                    self.sediment.move(x, x2)
+                    self.dirty.add(x2)
                     sp = y
                     newlevel = y + 1
-                else: ## fall diagonally
-                    value += 1 if c == GoodDroplet.color else -1
-                    left = x > 0 and self.levels[x - 1] > y + 1
-                    right = x < 63 and self.levels[x + 1] > y + 1
-                    if left and right:
-                        left = left and bool(getrandbits(1))
-                    y2 = y + 1
-                    if left:
-                        x2 = x - 1
-                    elif right:
-                        x2 = x + 1
-                    else:
-                        newlevel = y
-                    if left or right:
-                        self.canvas.putpixel((x, y), (0, 0, 0))
-                        self.mask.putpixel((x, y), 0)
-                        self.canvas.putpixel((x2, y2), c)
-                        self.mask.putpixel((x2, y2), 255)
-                        self.levels[x2] = y2
-                        sp = y
-                        newlevel = y + 1
-            self.levels[x] = newlevel
-        self.value = value
+                    changed = True
+        self.levels[x] = newlevel
+        if changed:
+            ## the neighbors may now be able to slide onto this column
+            self.dirty.update(n for n in (x - 1, x, x + 1) if 0 <= n < self.width)
+            self.rgb = None
+
+    def close (self):
+        pass
 
     def draw (self, pond, t):
-        if t >= self.lastupdate + self.update_rate:
-            self.runphysics(pond, t)
-            self.lastupdate = t
-        pond.canvas.paste(self.canvas, (0, 0), self.mask)
+        if self.rgb is None:
+            self.rgb = np.asarray(self.canvas)
+            self.alpha = np.asarray(self.mask, dtype=bool)
+        ## nothing is drawn above the tallest pile
+        top = max(0, min(self.levels))
+        if top < self.height:
+            pond.compositor.blit(self.rgb[top:], self.alpha[top:], (0, top))
 
 
 class Mode ():
@@ -189,8 +389,25 @@ class Mode ():
 
     def __init__ (self, pond):
         self.pond = pond
+        pond.error = None
         pond.switches.clearbindings()
-        pond.switches.last_press = time()
+        pond.switches.last_press = now()
+        pond.metrics.count("mode_changes_total", (("mode", type(self).__name__),))
+
+    def poll_switches (self, t):
+        pass
+
+    def draw (self, t):
+        """draw internal canvas"""
+        pond = self.pond
+        prof = pond.profiler
+        t0 = prof.clock()
+        pond.draw_bg()
+        t0 = prof.record("draw_bg", t0)
+        pond.mud.draw(pond, t)
+        t0 = prof.record("mud.draw", t0)
+        pond.draw_mobs(t)
+        prof.record("draw_mobs", t0)
 
 
 class ModeGameplay (Mode):
@@ -198,11 +415,10 @@ class ModeGameplay (Mode):
 
     def __init__ (self, pond):
         super(ModeGameplay, self).__init__(pond)
-        print("Mode: Gameplay")
         pond.set_level(pond.initial_level)
         pond.switches.bind(5, lambda: self.reset())
-        pond.switches.bind(6, lambda: GoodDroplet.spawn(pond, time()))
-        pond.switches.bind(7, lambda: BadDroplet.spawn(pond, time()))
+        pond.switches.bind(6, lambda: GoodDroplet.spawn(pond, now()))
+        pond.switches.bind(7, lambda: BadDroplet.spawn(pond, now()))
 
     def reset (self):
         pond = self.pond
@@ -211,21 +427,25 @@ class ModeGameplay (Mode):
     def adjust_level (self):
         pond = self.pond
         l = pond.level
-        rand = random()
+        rand = rng.random()
         threshold = 0.0001
         if rand < threshold:
             sign = 1 if rand >= threshold * 0.5 else -1
-            l = l + 1/32.0 * sign
+            l = l + 1.0 / pond.height * sign
             pond.set_level(max(min(l, 0.9), 0.4))
 
-    def runframe (self, t):
+    def poll_switches (self, t):
         pond = self.pond
         try:
             pond.switches.poll(t)
+            pond.error = None
         except GameError as e:
+            if not pond.error:
+                pond.metrics.count("errors_total", (("error", e.message),))
             pond.error = e
-            print(e)
 
+    def runframe (self, t):
+        pond = self.pond
         if self.auto_reset and t >= pond.switches.last_press + self.auto_reset:
             pond.current_mode = ModeReset(pond)
 
@@ -234,11 +454,7 @@ class ModeGameplay (Mode):
         self.adjust_level()
         pond.spawn_mobs(t)
 
-        ## draw internal canvas
-        ##
-        pond.draw_bg()
-        pond.mud.draw(pond, t)
-        pond.draw_mobs(t)
+        self.draw(t)
 
 
 class ModeStartGame (Mode):
@@ -246,11 +462,13 @@ class ModeStartGame (Mode):
 
     def __init__ (self, pond):
         super(ModeStartGame, self).__init__(pond)
-        print("Mode: StartGame")
-        t = time()
+        t = now()
         self.start_time = t
         pond.health = 1.0
-        pond.mud = Mud()
+        if pond.mud:
+            pond.mud.reset()
+        else:
+            pond.mud = pond.mud_class(pond.width, pond.height)
         pond.mobcounter = MobCounter()
 
 
@@ -263,11 +481,7 @@ class ModeStartGame (Mode):
         if pond.level >= pond.initial_level:
             pond.current_mode = ModeGameplay(pond)
 
-        ## draw internal canvas
-        ##
-        pond.draw_bg()
-        pond.mud.draw(pond, t)
-        pond.draw_mobs(t)
+        self.draw(t)
 
 
 
@@ -279,8 +493,7 @@ class ModeReset (Mode):
 
     def __init__ (self, pond):
         super(ModeReset, self).__init__(pond)
-        print("Mode: Reset")
-        t = time()
+        t = now()
         self.start_time = t
         scramtime = 0
         for mob in pond.mobs:
@@ -300,11 +513,7 @@ class ModeReset (Mode):
             if pond.level_px >= pond.height:
                 pond.current_mode = ModeStartGame(pond)
 
-        ## draw internal canvas
-        ##
-        pond.draw_bg()
-        pond.mud.draw(pond, t)
-        pond.draw_mobs(t)
+        self.draw(t)
 
 
 class Pond ():
@@ -312,6 +521,19 @@ class Pond ():
     healthsteps = 10
     active_spawners = []
     initial_level = 0.7
+    mud_class = Mud
+    frame_rate = 100
+    watercolor_steps = 32
+    background_init = True
+    record_path = None
+    status_interval = None ## seconds between status lines, None for none
+
+    ## matrix geometry: chain_length panels of panel_cols x panel_rows
+    ## across, and parallel chains down
+    panel_rows = 32
+    panel_cols = 64
+    chain_length = 1
+    parallel = 1
 
     ## internal
     matrix = None
@@ -323,107 +545,276 @@ class Pond ():
     width = 0
     height = 0
     canvas = None
+    compositor = None
     health = 1.0
     watercolor = None
     level = 0
     level_px = 0
     mobs = None
     current_mode = None
-
-    def __init__ (self, *args, **kwargs):
+    double_buffer = None
+    error = None
+    scheduler = None
+    profiler = None
+    metrics = None
+    bg_layer = None
+    bg_key = None
+    startup = None
+    spawners_ready = None
+    spawner_error = None
+    recorder = None
+    last_status = None
+
+    def __init__ (self, startup=None, *args, **kwargs):
         super(Pond, self).__init__(*args, **kwargs)
-        for spawner in self.active_spawners:
-            spawner.init_static()
-        self.mobs = []
-        self.switches = Switches()
+        self.startup = startup or StartupTimer()
+        t0 = self.startup.clock()
+        self.profiler = Profiler() if Profiler.enabled else NullProfiler()
+        self.profiler.install()
+        self.metrics = Metrics() if Metrics.enabled else NullMetrics()
+        self.mobs = MobCollection()
+        self.spawners_ready = threading.Event()
         self.ledstrip = LEDStrip()
+        t0 = self.startup.stage("ledstrip", t0)
         self.wave = Wave(self.ledstrip.sections["wave"])
+        self.scheduler = FrameScheduler(self.frame_rate, self.profiler)
+        self.scheduler.add_tick("switches.poll", Switches.poll_interval,
+                                lambda t: self.current_mode.poll_switches(t))
+        self.scheduler.add_tick("mud.runphysics", self.mud_class.update_rate,
+                                lambda t: self.mud.runphysics(self, t))
+        ##XXX: maybe also need modes for the led strip
+        self.scheduler.add_tick("wave.update", Wave.interval, self.wave.update)
+        if self.status_interval:
+            self.scheduler.add_tick("status", self.status_interval,
+                                    lambda t: self.report_status())
+        if Metrics.enabled:
+            self.scheduler.add_tick("metrics", Metrics.interval,
+                                    lambda t: self.metrics.sample(self, t))
+        self.startup.stage("wave", t0)
+
+    def start (self):
+        """
+        Bring up the matrix and show a first frame, an empty pond with the
+        wave running, before the switches and the game.  The spawners are
+        initialized in the background (unless background_init is off), and
+        spawning waits until they are ready.
+        """
+        startup = self.startup
+        t0 = startup.clock()
+        self.init_matrix()
+        t0 = startup.stage("matrix", t0)
+        self.set_level(0)
+        self.draw_bg()
+        t = now()
+        self.wave.update(t)
+        self.show(t)
+        t0 = startup.stage("first frame", t0)
+        self.switches = Switches()
+        t0 = startup.stage("switches", t0)
         self.current_mode = ModeStartGame(self)
-
-    def log_status (self):
-        print("[h:{:4.2f}] {}".format(
+        startup.stage("game", t0)
+        if self.background_init:
+            threading.Thread(target=self.init_spawners, name="init_spawners",
+                             daemon=True).start()
+        else:
+            self.init_spawners()
+
+    def init_spawners (self):
+        """
+        Initialize the spawners, then write the startup report to stderr.
+        spawners_ready is set even if one fails, and the error is raised
+        again by spawn_mobs on the main thread.
+        """
+        t0 = self.startup.clock()
+        try:
+            for spawner in self.active_spawners:
+                spawner.init_static()
+                t0 = self.startup.stage(spawner.__name__ + ".init_static", t0)
+        except Exception as e:
+            self.spawner_error = e
+            self.startup.stage("spawners failed", t0)
+        finally:
+            self.spawners_ready.set()
+            sys.stderr.write(self.startup.report())
+            sys.stderr.flush()
+
+    def status_line (self):
+        return "[h:{:4.2f}] {}".format(
             self.health,
-            " ".join(["{}:{}".format(k,v) for k,v in self.mobcounter.mobs.items()])))
+            " ".join(["{}:{}".format(k,v) for k,v in self.mobcounter.mobs.items()]))
+
+    def changed_status (self):
+        """the status line if it changed since the last call, else None"""
+        line = self.status_line()
+        if line != self.last_status:
+            self.last_status = line
+            return line
+        return None
+
+    def report_status (self):
+        """print the status if it changed since the last report"""
+        line = self.changed_status()
+        if line:
+            print(line)
 
     def add_mob (self, m):
-        z = m.z
-        i = next((i for i,x in enumerate(self.mobs) if x.z > z), len(self.mobs))
-        self.mobs.insert(i, m)
+        self.mobs.add(m)
 
     def set_level (self, level):
         self.level = level
-        self.level_px = int(self.level * -32 + 32)
+        self.level_px = int(self.level * -self.height + self.height)
 
     def spawn_mobs (self, t):
-        newmobs = False
+        if not self.spawners_ready.is_set():
+            return
+        if self.spawner_error:
+            raise self.spawner_error
         for x in self.active_spawners:
             f = x.maybe_spawn(self, t)
             if f:
-                newmobs = True
                 self.add_mob(f)
-        if newmobs:
-            self.log_status()
 
-    def draw_bg (self):
-        """draw the pond onto self.canvas up to the level represented by self.level"""
+    def update_health (self):
+        """sample health from the mud's sediment counts, once per frame"""
         self.health = max(0.0, min(1.0, (self.healthsteps + self.mud.value) / self.healthsteps))
+
+    def draw_bg (self):
+        """draw the pond into the frame up to the level represented by self.level"""
         healthycolor = (0x11, 0x22, 0x44)
         pollutedcolor = (0x66, 0x66, 0)
-        self.watercolor = [int((a - b) * self.health + b)
-                           for a,b in zip(healthycolor, pollutedcolor)]
-        colorname = "rgb({},{},{})".format(*self.watercolor)
-        w, h = self.width, self.height
-        self.draw.rectangle((0,0,w-1,self.level_px-1), "#000000")
-        self.draw.rectangle((0,self.level_px,w-1,h-1), colorname)
+        steps = self.watercolor_steps
+        health = round(self.health * steps) / steps
+        watercolor = tuple([int((a - b) * health + b)
+                            for a,b in zip(healthycolor, pollutedcolor)])
+        if watercolor != self.watercolor:
+            if self.watercolor:
+                gradients.evict(self.watercolor)
+            self.watercolor = watercolor
+
+        ## the background only changes with the level and the water color,
+        ## so it is rendered into bg_layer on change and copied otherwise.
+        key = (self.level_px, self.watercolor)
+        if key != self.bg_key:
+            self.bg_key = key
+            level_px = max(0, self.level_px)
+            self.bg_layer[:level_px] = 0
+            self.bg_layer[level_px:] = self.watercolor
+        self.compositor.fill(self.bg_layer)
 
     def draw_mobs (self, t):
-        nmobs = len(self.mobs)
-        self.mobs = [mob for mob in self.mobs if mob.update(self, t)]
-        if nmobs != len(self.mobs):
-            self.log_status()
-
-    def run (self):
+        prof = self.profiler
+        if prof.enabled:
+            dead = []
+            for mob in self.mobs:
+                t0 = prof.clock()
+                if not mob.update(self, t):
+                    dead.append(mob)
+                prof.record("mob:" + type(mob).__name__, t0)
+        else:
+            dead = [mob for mob in self.mobs if not mob.update(self, t)]
+        for mob in dead:
+            self.mobs.remove(mob)
+
+    @classmethod
+    def matrix_options (cls):
         options = RGBMatrixOptions()
-        options.rows = 32
-        options.cols = 64
-        options.chain_length = 1
-        options.parallel = 1
+        options.rows = cls.panel_rows
+        options.cols = cls.panel_cols
+        options.chain_length = cls.chain_length
+        options.parallel = cls.parallel
         options.row_address_type = 0
         options.multiplexing = 0
         options.pwm_bits = 11
         options.brightness = 100
         options.pwm_lsb_nanoseconds = 130
         options.led_rgb_sequence = "RGB"
-        self.matrix = RGBMatrix(options = options)
-
-        double_buffer = self.matrix.CreateFrameCanvas()
-        self.width = double_buffer.width
-        self.height = double_buffer.height
-        self.canvas = Image.new("RGB", (self.width, self.height))
-        self.draw = ImageDraw.Draw(self.canvas)
-        self.set_level(self.level)
+        return options
 
-        while True:
-            self.error = None
-            t = time()
+    def init_matrix (self):
+        self.matrix = RGBMatrix(options = self.matrix_options())
 
-            self.current_mode.runframe(t)
+        self.double_buffer = self.matrix.CreateFrameCanvas()
+        self.width = self.double_buffer.width
+        self.height = self.double_buffer.height
+        self.compositor = Compositor(self.width, self.height)
+        self.bg_layer = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        self.set_level(self.level)
+        if self.record_path:
+            self.recorder = FrameRecorder(self.record_path, self.width, self.height,
+                                          self.ledstrip.npixels)
 
-            ## if there was an error, set visual indicator
-            if self.error:
-                self.canvas.putpixel((63, 0), self.error.color)
+    def runframe (self, t):
+        prof = self.profiler
+        start = prof.clock()
+        mstart = self.metrics.clock()
+        self.scheduler.run_ticks(t)
+        self.compose(t)
+        self.show(t)
+        prof.record("frame", start)
+        self.metrics.record_frame(mstart)
+
+    def compose (self, t):
+        """run the game for frame time t and queue the drawing of the frame"""
+        prof = self.profiler
+        t0 = prof.clock()
+        self.mud.step(self, t)
+        self.update_health()
+        t0 = prof.record("mud.step", t0)
+        self.current_mode.runframe(t)
+        prof.record("mode.runframe", t0)
+
+        ## if there was an error, set visual indicator
+        if self.error:
+            self.compositor.pixel((self.width - 1, 0), self.error.color)
+
+    def show (self, t):
+        """write the composed frame to the matrix and the strip buffer to the strip"""
+        self.flush(t)
+        self.present()
+        t0 = self.profiler.clock()
+        self.ledstrip.show()
+        self.profiler.record("strip.show", t0)
+
+    def flush (self, t):
+        """draw the queued frame into self.canvas, and record it"""
+        prof = self.profiler
+        t0 = prof.clock()
+        self.canvas = self.compositor.flush()
+        t0 = prof.record("compositor.flush", t0)
+        if self.recorder:
+            self.recorder.record(t, self.compositor.frame, self.ledstrip.buffer)
+            prof.record("recorder.record", t0)
+
+    def present (self):
+        """write self.canvas to the matrix, waiting for vsync"""
+        prof = self.profiler
+        t0 = prof.clock()
+        self.double_buffer.SetImage(self.canvas)
+        t0 = prof.record("SetImage", t0)
+        self.double_buffer = self.matrix.SwapOnVSync(self.double_buffer)
+        prof.record("SwapOnVSync", t0)
+
+    def shutdown (self):
+        if self.switches:
+            self.switches.stop()
+        if self.recorder:
+            self.recorder.close()
+        if self.mud:
+            self.mud.close()
+        self.metrics.close()
+        self.ledstrip.clear()
 
-            ## write canvas to matrix
-            ##
-            double_buffer.SetImage(self.canvas)
-            double_buffer = self.matrix.SwapOnVSync(double_buffer)
+    def run (self):
+        self.start()
+        while True:
+            self.runframe(self.scheduler.wait())
 
-            ## write led strip
-            ##
-            self.wave.update(t) ##XXX: maybe also need modes for the led strip
-            self.ledstrip.strip.show(self.ledstrip.buffer)
 
-            sleep(0.01)
+def load_config (configpath):
+    """compile and run a config file in the global namespace of this module"""
+    with open(configpath) as f:
+        code = compile(f.read(), configpath, 'exec')
+        exec(code, globals())
 
 
 if __name__ == "__main__":
@@ -433,15 +824,14 @@ if __name__ == "__main__":
     if argc != 2:
         print("Usage: watershed.py <config>")
         sys.exit(1)
-    configpath = sys.argv[1]
-    with open(configpath) as f:
-        code = compile(f.read(), configpath, 'exec')
-        exec(code)
-    pond = Pond()
+    startup = StartupTimer()
+    t0 = startup.clock()
+    load_config(sys.argv[1])
+    startup.stage("config", t0)
+    pond = Pond(startup)
     try:
         pond.run()
     except KeyboardInterrupt:
         print("Exiting\n")
-        pond.ledstrip.strip.clear()
-        pond.ledstrip.strip.show()
+        pond.shutdown()
         sys.exit(0)